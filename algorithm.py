@@ -1,25 +1,37 @@
 #%%
 # Packages, constants and utils:
+from algorithm import MARKET_DATA_DIR
 from algorithm import SPOT_DATA_FILE
 from algorithm import VOL_DATA_FILE
+from algorithm import TRADE_LOG_FILE
 
 from algorithm.utils import (
     FileDef,
     load_csv_data,
-    get_index_of_first,
+    smile_file_defs,
 )
 from algorithm.stat_methods import (
     calc_annual_realised_vol,
     calc_moving_percentile,
     forecast_ema_vol,
+    first_valid_index,
 )
 from algorithm.trade_classes import VarianceSwap
+from algorithm.term_structure import VolTermStructure
+from algorithm.risk import VarianceSwapBook
+from algorithm.skew import smile_from_dataframe, estimate_skew_slopes
+from algorithm.bootstrap import bootstrap_grid_hit_rates
+from algorithm.walk_forward import walk_forward
+from algorithm.strategy import RuleSet, simulate_summary
+from algorithm.trade_log import TradeLogWriter
+from algorithm.vol_estimators import CloseToClose, HAR, GARCH11
 from algorithm.graphics import PandasHeatMapPlot
 
+import os
 import numpy as np
+import pandas as pd
 from datetime import timedelta
 
-not_nan = lambda val: not np.isnan(val)
 YEAR_WINDOW = 252  # 1Y (in business_days)
 
 
@@ -28,9 +40,18 @@ YEAR_WINDOW = 252  # 1Y (in business_days)
 swap_window_size = 21  # 1M (in business_days)
 percentile_window_size = YEAR_WINDOW
 ema_lambda = 0.97
+r = 0.0  # Discount rate of the MTMs (annualised, continuously compounded)
+
+# Processes used by the bootstrap and the walk-forward. This script has no
+# main guard, so keep 1 unless running it from one (under the "spawn" start
+# method every worker would re-run the whole script).
+n_jobs = 1
 
 x_cells_in_plot = 20
 y_cells_in_plot = 30
+# Fixed bounds of the 1M vol carry in the walk-forward grid, so that no fold
+# sees the range of later carries. Carries outside fall in the edge cells.
+wf_carry_bounds = (-0.02, 0.02)
 
 T_swap = swap_window_size / YEAR_WINDOW  # (in years)
 
@@ -41,6 +62,11 @@ file_defs = [
     FileDef(filename=SPOT_DATA_FILE, colname="spot"),
     FileDef(filename=VOL_DATA_FILE, colname="1m_annualised_atmf_vol"),
 ]
+# Load the 1M risk reversals and butterflies when available
+skew_file_defs = smile_file_defs("EURUSD", "1m", MARKET_DATA_DIR)
+has_skew_data = all(os.path.exists(f.filename) for f in skew_file_defs)
+if has_skew_data:
+    file_defs += skew_file_defs
 df = load_csv_data(*file_defs)
 
 
@@ -55,6 +81,10 @@ df.sort_values(by="date", ascending=True, inplace=True)
 df["1m_annualised_atmf_vol"] = df["1m_annualised_atmf_vol"] / 100
 df["1m_atmf_vol"] = df["1m_annualised_atmf_vol"] * (swap_window_size / 252) ** 0.5
 
+# Convert the risk reversals and butterflies to decimals
+skew_cols = [f.colname for f in skew_file_defs] if has_skew_data else []
+df[skew_cols] = df[skew_cols] / 100
+
 # Calculate implied volatility percentile for a 1-year window
 df["1y_implied_vol_percentile"] = np.NaN
 df["1y_implied_vol_percentile"] = calc_moving_percentile(
@@ -62,16 +92,19 @@ df["1y_implied_vol_percentile"] = calc_moving_percentile(
 )
 print(df.head())
 
-# Calculate forecasted 1M realised vol using EMA
-start = get_index_of_first(np.array(df["spot"]), not_nan)
-first_year_spots = np.array(np.array(df["spot"].iloc[start : start + YEAR_WINDOW]))
+# Calculate forecasted 1M realised vol using EMA. It is seeded with the
+# realised vol of the first year of spots, and starts on the last date of
+# that year, so that no forecast uses a later spot.
+start = first_valid_index(np.array(df["spot"]))
+seed_end = start + YEAR_WINDOW
+first_year_spots = np.array(np.array(df["spot"].iloc[start:seed_end]))
 vol_0_monthly = calc_annual_realised_vol(first_year_spots) / (
     12 ** 0.5
 )  # From annualised to monthly
 
 df["1m_realised_ema_vol_forecast"] = np.NaN
-df["1m_realised_ema_vol_forecast"][start:] = forecast_ema_vol(
-    levels=np.array(df["spot"].iloc[start:]),
+df["1m_realised_ema_vol_forecast"][seed_end - 1 :] = forecast_ema_vol(
+    levels=np.array(df["spot"].iloc[seed_end - 1 :]),
     vol_0=vol_0_monthly,
     window_size=swap_window_size,
     _lambda=ema_lambda
@@ -79,9 +112,12 @@ df["1m_realised_ema_vol_forecast"][start:] = forecast_ema_vol(
 print(df.head())
 
 #%%
-# Remove null values araising from window discrepancies
-df.dropna(inplace=True)
-print(df.head())
+# Mark the rows with all the signals available. Missing values araise from
+# window discrepancies and from dates with no spot. Dates with missing smile
+# quotes are also skipped, as their fair strike cannot be estimated.
+signal_cols = ["spot", "1y_implied_vol_percentile", "1m_realised_ema_vol_forecast"]
+signal_cols += skew_cols
+valid = ~np.isnan(np.array(df[signal_cols], dtype=float)).any(axis=1)
 
 # %%
 # Create a trade to be traded every day at the fair strike K,
@@ -89,61 +125,215 @@ print(df.head())
 # For this, calculate K_fair using a rule-of-thumb described
 # Bassu-Strasser-Guichard Varswap paper.
 
-# Although not a fair assumption, there is no enough market data
-# to estimatethis value. It would have been possible if volatility
-# data for different deltas was provided.
-skew_slope = 0
+# The skew slope of each date is estimated from the 1M smile when the
+# risk reversals and butterflies are loaded. Otherwise, although not a
+# fair assumption, there is no enough market data to estimate it.
+if has_skew_data:
+    smiles = smile_from_dataframe(df, ["1m"])
+    skew_slope = estimate_skew_slopes(smiles, T=T_swap)[:, 0]
+else:
+    skew_slope = 0
+
+# Fair strikes for every trade date are estimated in one go from the
+# implied vol term structure. More tenors can be added to the term
+# structure as they are loaded (e.g. {"1m_annualised_atmf_vol": "1m",
+# "1y_annualised_atmf_vol": "1y"}).
+term_structure = VolTermStructure.from_dataframe(
+    df, {"1m_annualised_atmf_vol": "1m"}
+)
+fair_strikes = VarianceSwap.estimate_fair_strike(
+    term_structure, T=T_swap, skew_slope=skew_slope
+)
 
 # We also calculate the payoff at maturity of each trade, distinguishing
 # between those that are profitable and those that are not.
+# The open, mark and settlement events of the trades are written to a
+# binary log, which can be reloaded with `TradeLogReader`.
 
 latest_date = df["date"].max()
-fair_trades = [np.NaN] * df.shape[0]
+df["value_date"] = df["date"] + timedelta(days=round(365 * T_swap))
+trades = []
+trade_ids = [None] * df.shape[0]
 payoffs = [np.NaN] * df.shape[0]
-# TODO: loop below is very inefficient. Implement efficient algorithm
-for indx, pair in enumerate(df.iterrows()):
-    row = pair[1]
-    if np.isnan(row["1m_atmf_vol"]) or np.isnan(row["spot"]):
-        continue
-    fair_strike = VarianceSwap.estimate_fair_strike(
-        row["1m_annualised_atmf_vol"], T=T_swap, skew_slope=skew_slope
-    )
+with TradeLogWriter(TRADE_LOG_FILE, overwrite=True) as trade_log:
+    # TODO: loop below is very inefficient. Implement efficient algorithm
+    for indx, pair in enumerate(df.iterrows()):
+        row = pair[1]
+        if not valid[indx]:
+            continue
+        trade = VarianceSwap(
+            direction="buy",
+            underlying="EURUSD",
+            trade_date=row["date"],
+            value_date=row["value_date"],
+            strike=fair_strikes[indx],
+            vega_amount=1,
+        )
+        trades.append(trade)
+        trade_ids[indx] = str(trade.trade_id)
+        trade_log.log_open(trade)
 
-    trade = VarianceSwap(
-        direction="buy",
-        underlying="EURUSD",
-        trade_date=row["date"],
-        value_date=row["date"] + timedelta(days=round(365 * T_swap)),
-        strike=fair_strike,
-        vega_amount=1,
-    )
-    fair_trades[indx] = trade
+        # Take the exact dates at which the trade was valued. Not just a fixed window
+        # We assume that the trade date does not count as valuation, but the value
+        # date does. Dates with no spot are skipped by `calc_final_realised_vol`.
+        dates_in_trade = (df["date"] > trade.trade_date) & (
+            df["date"] <= trade.value_date
+        )
+        levels = np.array(df.loc[dates_in_trade, "spot"])
 
-    # Take the exact dates at which the trade was valued. Not just a fixed window
-    # We assume that the trade date does not count as valuation, but the value date
-    # does.
-    dates_in_trade = (df["date"] > trade.trade_date) & (df["date"] <= trade.value_date)
-    levels = np.array(df.loc[dates_in_trade, "spot"])
+        # If the expiry date later than the latest date in the dataframe, then break
+        if latest_date < trade.value_date:
+            break
+        final_realised_vol = VarianceSwap.calc_final_realised_vol(levels)
+        payoffs[indx] = trade.payoff(final_realised_vol)
+        trade_log.log_settlement(trade, payoffs[indx], final_realised_vol)
 
-    # If the expiry date later than the latest date in the dataframe, then break
-    if latest_date < trade.value_date:
-        break
-    final_realised_vol = VarianceSwap.calc_final_realised_vol(levels)
-    payoffs[indx] = trade.payoff(final_realised_vol)
+    # Mark every trade at every date at which it is live, in one batch
+    book = VarianceSwapBook(trades)
+    mark_rows, mark_realised_vols, marks = book.calc_mtm_history(
+        term_structure, np.array(df["spot"]), r, skew_slope=skew_slope
+    )
+    trade_log.log_marks(
+        trades, term_structure.dates[mark_rows], marks, mark_realised_vols
+    )
 
-df["fair_trade"] = fair_trades
+df["trade_id"] = trade_ids
 df["payoff"] = payoffs
 df["profitable"] = df["payoff"] > 0
 
+# The MTM of the open trades at each date
+marked = ~np.isnan(marks)
+df["open_trades_mtm"] = np.bincount(
+    mark_rows[marked], weights=marks[marked], minlength=df.shape[0]
+)
+
 #%%
 # Calculate Vol Carry and mark trades that are profitable for each trade date
 df["vol_carry"] = df["1m_atmf_vol"] - df["1m_realised_ema_vol_forecast"]
 
 
 #%%
-# Plot heatmap
+# Compare the vol carry of alternative 1M realised vol forecasters, by the
+# correlation of their carry with the payoff of the trades. The dates with
+# no spot are dropped so that their neighbouring returns are kept. HAR and
+# GARCH are fitted on the first 2Y of spots and the EMA is seeded on the
+# first year, and every forecaster is compared on the following dates only.
+# Every forecast only uses the spots up to its date.
+fit_size = 2 * YEAR_WINDOW
+forecasters = {
+    "ema": None,
+    "close_to_close": CloseToClose(window_size=swap_window_size),
+    "har": HAR(window_size=swap_window_size, fit_size=fit_size),
+    "garch": GARCH11(window_size=swap_window_size, fit_size=fit_size),
+}
+has_spot = ~np.isnan(np.array(df["spot"], dtype=float))
+spots = np.array(df.loc[has_spot, "spot"], dtype=float)
+trade_payoffs = np.array(df["payoff"], dtype=float)
+out_of_sample = np.zeros(df.shape[0], dtype=bool)
+out_of_sample[np.flatnonzero(has_spot)[fit_size:]] = True
+carry_correlations = {}
+for name, forecaster in forecasters.items():
+    if forecaster is None:
+        carries = np.array(df["vol_carry"]) * (YEAR_WINDOW / swap_window_size) ** 0.5
+    else:
+        carries = np.full(df.shape[0], np.NaN)
+        carries[has_spot] = (
+            np.array(df.loc[has_spot, "1m_annualised_atmf_vol"])
+            - forecaster.estimate(spots)[:, 0]
+        )
+    compared = valid & out_of_sample & ~np.isnan(carries) & ~np.isnan(trade_payoffs)
+    carry_correlations[name] = np.corrcoef(
+        carries[compared], trade_payoffs[compared]
+    )[0, 1]
+print(pd.Series(carry_correlations, name="carry_payoff_correlation"))
+
+
+#%%
+# Bootstrap confidence intervals of the hit rate of each heatmap cell.
+# Overlapping 1M trades are resampled in blocks of one swap window. The
+# trades that have not settled yet have no outcome and are left out.
 plot_cols = ["1y_implied_vol_percentile", "vol_carry", "profitable"]
-plot = PandasHeatMapPlot(df[plot_cols], x_cells_in_plot, y_cells_in_plot, *plot_cols)
+settled = valid & np.array(df["payoff"].notna())
+hit_rate_intervals = bootstrap_grid_hit_rates(
+    df.loc[settled, plot_cols],
+    x_cells_in_plot,
+    y_cells_in_plot,
+    *plot_cols,
+    n_resamples=10_000,
+    block_size=swap_window_size,
+    seed=0,
+    n_jobs=n_jobs,
+)
+print(hit_rate_intervals.sort_values("total_count", ascending=False).head())
+
+
+#%%
+# Walk-forward evaluation: fit the hit rates on 2Y of trades and trade the
+# following 3M, buying (selling) in the cells with a training hit rate above
+# (below) 50%. The training windows only keep the trades that settle before
+# their test window starts, and the grid bounds are fixed inputs.
+wf_shape = (
+    {"divisions": x_cells_in_plot, "max": 1, "min": 0},
+    {
+        "divisions": y_cells_in_plot,
+        "max": wf_carry_bounds[1],
+        "min": wf_carry_bounds[0],
+    },
+)
+wf_results = walk_forward(
+    np.array(df.loc[valid, "date"]),
+    np.array(df.loc[valid, "1y_implied_vol_percentile"]),
+    np.array(df.loc[valid, "vol_carry"]),
+    np.array(df.loc[valid, "payoff"]),
+    wf_shape,
+    train_size=2 * YEAR_WINDOW,
+    test_size=3 * swap_window_size,
+    value_dates=np.array(df.loc[valid, "value_date"]),
+    min_count=10,
+    n_jobs=n_jobs,
+)
+print(wf_results)
+print("Walk-forward P&L:", wf_results.pnl.sum())
+
+
+#%%
+# Simulate selling 1 vega every day the vol percentile and vol carry are
+# above a pair of thresholds, for a grid of thresholds. The swaps settle on
+# the first date on or after their value date, and are marked daily while
+# open, so that the drawdown includes their MTM. The rules are simulated in
+# chunks, keeping only the summary of each.
+valid_dates = np.array(df.loc[valid, "date"])
+settlement_indexes = np.searchsorted(
+    valid_dates, np.array(df.loc[valid, "value_date"])
+)
+# The marks of the swap traded on each date, at the indexes of the dates
+day_indexes = np.cumsum(valid) - 1
+mark_indexes = np.zeros((len(valid_dates), marks.shape[1]), dtype=int)
+daily_marks = np.full((len(valid_dates), marks.shape[1]), np.NaN)
+mark_indexes[: len(trades)] = day_indexes[mark_rows]
+daily_marks[: len(trades)] = np.where(valid[mark_rows], marks, np.NaN)
+
+rules = RuleSet.grid(
+    sell_percentile=np.linspace(0, 0.95, 20),
+    sell_carry=np.linspace(0, df.loc[valid, "vol_carry"].max(), 20),
+)
+simulation_summary = simulate_summary(
+    rules,
+    np.array(df.loc[valid, "1y_implied_vol_percentile"]),
+    np.array(df.loc[valid, "vol_carry"]),
+    np.array(df.loc[valid, "payoff"]),
+    settlement_indexes,
+    marks=(mark_indexes, daily_marks),
+)
+rule_results = pd.concat([rules.to_frame(), simulation_summary], axis=1)
+print(rule_results.sort_values("pnl", ascending=False).head())
+
+
+#%%
+# Plot heatmap
+plot = PandasHeatMapPlot(
+    df.loc[settled, plot_cols], x_cells_in_plot, y_cells_in_plot, *plot_cols
+)
 plot.show(
     xlabel="Vol Percentile(%)",
     ylabel="Vol Carry(%)",
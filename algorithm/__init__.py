@@ -4,3 +4,4 @@ import os
 MARKET_DATA_DIR = "market_data"
 SPOT_DATA_FILE = os.path.join(MARKET_DATA_DIR, "EURUSDxSPOT.csv")
 VOL_DATA_FILE = os.path.join(MARKET_DATA_DIR, "EURUSDxVOL.csv")
+TRADE_LOG_FILE = "trade_log.bin"
@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from algorithm.stat_methods import gridise_arrays
+
+
+def block_bootstrap_indexes(
+    n: int, n_resamples: int, block_size: int, random_state: np.random.RandomState
+) -> np.ndarray:
+    """Draw the indexes of a moving block bootstrap in bulk.
+
+    Each resample is made of consecutive blocks of block_size
+    observations starting at random positions, so that the dependence
+    between neighbouring observations (e.g. overlapping trades) is kept.
+
+    Returns:
+        an int array of shape (n_resamples, n)
+    """
+    block_size = max(1, min(block_size, n))
+    n_blocks = -(-n // block_size)
+    starts = random_state.randint(0, n - block_size + 1, size=(n_resamples, n_blocks))
+    indexes = starts[:, :, np.newaxis] + np.arange(block_size)
+    return indexes.reshape(n_resamples, -1)[:, :n]
+
+
+def _resample_hit_rates(
+    cells: np.ndarray,
+    positives: np.ndarray,
+    n_cells: int,
+    n_resamples: int,
+    block_size: int,
+    seed: tuple,
+) -> np.ndarray:
+    """Hit rates per cell of a chunk of resamples, of shape (n_resamples, n_cells)"""
+    random_state = np.random.RandomState(seed)
+    indexes = block_bootstrap_indexes(len(cells), n_resamples, block_size, random_state)
+    # Offset the cells of each resample, so a single bincount aggregates them all
+    offset_cells = (
+        cells[indexes] + n_cells * np.arange(n_resamples)[:, np.newaxis]
+    ).ravel()
+    size = n_resamples * n_cells
+    counts = np.bincount(offset_cells, minlength=size)
+    positive_counts = np.bincount(
+        offset_cells, weights=positives[indexes].ravel(), minlength=size
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (positive_counts / counts).reshape(n_resamples, n_cells)
+
+
+def bootstrap_hit_rates(
+    cells: np.ndarray,
+    positives: np.ndarray,
+    n_cells: int = None,
+    n_resamples: int = 10_000,
+    block_size: int = 1,
+    confidence: float = 0.95,
+    seed: int = None,
+    n_jobs: int = 1,
+    chunk_size: int = 500,
+) -> pd.DataFrame:
+    """Calculate bootstrap confidence intervals of the hit rate of each cell.
+
+    Args:
+        cells: an int array with the cell of each observation
+            (e.g. of each trade, ordered by trade date).
+        positives: a bool array with the outcome of each observation.
+    Kwargs:
+        n_cells (int, default: max(cells) + 1) - Number of cells
+        n_resamples (int, default: 10_000) - Number of bootstrap resamples
+        block_size (int, default: 1) - Number of consecutive observations
+            resampled together. Use the trade length in observations
+            for overlapping trades.
+        confidence (float, default: 0.95) - Confidence level of the intervals
+        seed (int, default: None) - Seed for reproducible results. The
+            results do not depend on n_jobs.
+        n_jobs (int, default: 1) - Number of processes
+        chunk_size (int, default: 500) - Number of resamples drawn at once
+    Returns:
+        a dataframe indexed by cell with the columns total_count,
+        positive_count, hit_rate, lower and upper. The bounds are NaN
+        for cells with no observations.
+    """
+    cells = np.asarray(cells, dtype=np.int64)
+    positives = np.asarray(positives, dtype=float)
+    n_cells = int(cells.max()) + 1 if n_cells is None else n_cells
+    if seed is None:
+        seed = np.random.randint(2 ** 31)
+
+    chunk_sizes = [chunk_size] * (n_resamples // chunk_size)
+    if n_resamples % chunk_size:
+        chunk_sizes.append(n_resamples % chunk_size)
+    args = [
+        (cells, positives, n_cells, size, block_size, (seed, chunk))
+        for chunk, size in enumerate(chunk_sizes)
+    ]
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            hit_rates = list(executor.map(_resample_hit_rates, *zip(*args)))
+    else:
+        hit_rates = [_resample_hit_rates(*arg) for arg in args]
+    hit_rates = np.concatenate(hit_rates)
+
+    total_count = np.bincount(cells, minlength=n_cells)
+    positive_count = np.bincount(cells, weights=positives, minlength=n_cells)
+    α = (1 - confidence) / 2
+    # Resamples with no observations in a cell carry no information on it
+    sorted_hit_rates = np.sort(hit_rates, axis=0)  # NaNs are sorted last
+    n_valid = (~np.isnan(hit_rates)).sum(axis=0)
+    lower, upper = np.full(n_cells, np.NaN), np.full(n_cells, np.NaN)
+    has_samples = n_valid > 0
+    columns = np.flatnonzero(has_samples)
+    for bound, q in ((lower, α), (upper, 1 - α)):
+        rows = np.round(q * (n_valid[has_samples] - 1)).astype(int)
+        bound[has_samples] = sorted_hit_rates[rows, columns]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit_rate = positive_count / total_count
+    return pd.DataFrame(
+        {
+            "total_count": total_count,
+            "positive_count": positive_count,
+            "hit_rate": hit_rate,
+            "lower": lower,
+            "upper": upper,
+        },
+        index=pd.Index(np.arange(n_cells), name="cell"),
+    )
+
+
+def bootstrap_grid_hit_rates(
+    df: pd.DataFrame,
+    xdivs: int,
+    ydivs: int,
+    xcolname: str,
+    ycolname: str,
+    pcolname: str,
+    **kwargs,
+) -> pd.DataFrame:
+    """Bootstrap the hit rates of the cells of a heatmap grid, as
+    built by `PandasHeatMapPlot`.
+
+    Args:
+        df: a dataframe with the x, y and bool p columns, ordered by date.
+        xcolname: the name of the col with the values of the x-axis
+        ycolname: the name of the col with the values of the y-axis
+        pcolname: the name of the column with bool values
+    Kwargs:
+        see `bootstrap_hit_rates`
+    Returns:
+        the dataframe of `bootstrap_hit_rates` for the non-empty cells,
+        with an additional coordinates column with the (x, y) cell tuples.
+    """
+    xs, ys = np.array(df[xcolname], dtype=float), np.array(df[ycolname], dtype=float)
+    shape = (
+        {"divisions": xdivs, "max": xs.max(), "min": xs.min()},
+        {"divisions": ydivs, "max": ys.max(), "min": ys.min()},
+    )
+    xcells, ycells = gridise_arrays(shape, xs, ys)
+    results = bootstrap_hit_rates(
+        xcells * ydivs + ycells,
+        np.array(df[pcolname], dtype=bool),
+        n_cells=xdivs * ydivs,
+        **kwargs,
+    )
+    results = results[results.total_count > 0].copy()
+    results["coordinates"] = [divmod(cell, ydivs) for cell in results.index]
+    return results
@@ -0,0 +1,239 @@
+from multiprocessing import shared_memory, resource_tracker
+import json
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+CATALOG_SIZE = 64 * 1024  # bytes
+HEADER_FIELDS = ("version", "length", "capacity")
+HEADER_SIZE = 8 * len(HEADER_FIELDS)
+RETRY_INTERVAL = 1e-4  # seconds
+_ATTACH_LOCK = threading.Lock()
+
+
+def _create_segment(name: str, size: int) -> shared_memory.SharedMemory:
+    return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+
+def _attach_segment(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment without registering it with the resource
+    tracker, which would unlink it when the reader exits (bpo-39959)"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _header(shm: shared_memory.SharedMemory) -> np.ndarray:
+    return np.ndarray(len(HEADER_FIELDS), dtype=np.int64, buffer=shm.buf)
+
+
+def _column_views(
+    shm: shared_memory.SharedMemory, columns: list, capacity: int
+) -> dict:
+    """Views of the date column and value columns of a pair segment"""
+    views = {
+        "date": np.ndarray(
+            capacity, dtype="datetime64[D]", buffer=shm.buf, offset=HEADER_SIZE
+        )
+    }
+    for i, column in enumerate(columns):
+        offset = HEADER_SIZE + 8 * capacity * (i + 1)
+        views[column] = np.ndarray(
+            capacity, dtype=np.float64, buffer=shm.buf, offset=offset
+        )
+    return views
+
+
+class MarketDataWriter:
+    """Single writer of a shared memory market data store.
+
+    Each pair is held in its own segment, with a date column and any
+    number of float columns (e.g. spot and vol) aligned by row, and a
+    header with a version counter, the number of rows and the capacity.
+    A catalog segment lists the segment and columns of every pair.
+    Rows are only ever appended, so readers can keep their views.
+    """
+
+    def __init__(self, store_name: str) -> None:
+        self._store_name = store_name
+        self._catalog = {}
+        self._catalog_shm = _create_segment(f"{store_name}_catalog", CATALOG_SIZE)
+        self._segments = {}
+        self._write_catalog()
+
+    def __enter__(self) -> "MarketDataWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _write_catalog(self) -> None:
+        data = json.dumps(self._catalog).encode("utf-8")
+        if HEADER_SIZE + len(data) > CATALOG_SIZE:
+            raise ValueError("Too many pairs for the catalog")
+        header = _header(self._catalog_shm)
+        header[0] += 1  # Odd while writing
+        self._catalog_shm.buf[HEADER_SIZE : HEADER_SIZE + len(data)] = data
+        header[1] = len(data)
+        header[0] += 1
+
+    def publish(self, pair: str, dates, capacity: int = None, **columns) -> None:
+        """Publish the history of a pair to a new segment.
+
+        Args:
+            pair: the pair name (e.g. "EURUSD").
+            dates: the dates of the rows, in ascending order.
+            columns: an array per column, aligned with dates.
+        Kwargs:
+            capacity (int, default: twice the number of rows) - Maximum
+                number of rows, including the appended ones
+        """
+        if pair in self._catalog:
+            raise ValueError(f"{pair} is already published")
+        capacity = 2 * len(dates) if capacity is None else capacity
+        names = list(columns)
+        segment_name = f"{self._store_name}_{pair}"
+        shm = _create_segment(
+            segment_name, HEADER_SIZE + 8 * capacity * (len(names) + 1)
+        )
+        _header(shm)[:] = [0, 0, capacity]
+        self._segments[pair] = (shm, names)
+        self.append(pair, dates, **columns)
+        self._catalog[pair] = {"segment": segment_name, "columns": names}
+        self._write_catalog()
+
+    def publish_dataframe(self, pair: str, df: pd.DataFrame, **kwargs) -> None:
+        """Publish a dataframe as returned by `load_csv_data`, sorted by date"""
+        df = df.sort_values(by="date")
+        columns = {col: np.array(df[col], dtype=float) for col in df if col != "date"}
+        self.publish(pair, np.array(df["date"]), **kwargs, **columns)
+
+    def append(self, pair: str, dates, **columns) -> None:
+        """Append rows to a published pair. All its columns are required."""
+        shm, names = self._segments[pair]
+        if set(columns) != set(names):
+            raise ValueError(f"The columns of {pair} are {names}")
+        header = _header(shm)
+        length, capacity = int(header[1]), int(header[2])
+        n = len(dates)
+        if length + n > capacity:
+            raise ValueError(f"Capacity of {pair} exceeded ({capacity} rows)")
+        views = _column_views(shm, names, capacity)
+        header[0] += 1  # Odd while writing
+        views["date"][length : length + n] = np.asarray(dates, dtype="datetime64[D]")
+        for name in names:
+            views[name][length : length + n] = columns[name]
+        header[1] = length + n
+        header[0] += 1
+
+    def close(self) -> None:
+        """Close and remove all the segments of the store"""
+        for shm, _ in self._segments.values():
+            shm.close()
+            shm.unlink()
+        self._catalog_shm.close()
+        self._catalog_shm.unlink()
+        self._segments = {}
+
+
+class MarketDataReader:
+    """Read-only, zero-copy reader of a shared memory market data store
+    (see `MarketDataWriter`). Any number of processes can attach."""
+
+    def __init__(self, store_name: str, timeout: float = 1.0) -> None:
+        """Args:
+        store_name: the name the writer was created with.
+        Kwargs:
+            timeout (float, default: 1.0) - Seconds to wait for a write
+                to finish before a read fails, e.g. if the writer died
+                while writing
+        """
+        self._catalog_shm = _attach_segment(f"{store_name}_catalog")
+        self._segments = {}
+        self._timeout = timeout
+
+    def __enter__(self) -> "MarketDataReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _consistent_read(self, shm: shared_memory.SharedMemory, read: callable):
+        """Retry a read until no write happened while reading"""
+        header = _header(shm)
+        deadline = time.monotonic() + self._timeout
+        while True:
+            version = int(header[0])
+            if not version % 2:
+                result = read(header)
+                if int(header[0]) == version:
+                    return version, result
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Segment {shm.name} has been written for over {self._timeout}s"
+                )
+            time.sleep(RETRY_INTERVAL)
+
+    def catalog(self) -> dict:
+        def read(header):
+            return bytes(self._catalog_shm.buf[HEADER_SIZE : HEADER_SIZE + header[1]])
+
+        _, data = self._consistent_read(self._catalog_shm, read)
+        return json.loads(data.decode("utf-8"))
+
+    def pairs(self) -> list:
+        return list(self.catalog())
+
+    def _segment(self, pair: str) -> tuple:
+        if pair not in self._segments:
+            catalog = self.catalog()
+            if pair not in catalog:
+                raise KeyError(f"{pair} is not published")
+            shm = _attach_segment(catalog[pair]["segment"])
+            capacity = int(_header(shm)[2])
+            views = _column_views(shm, catalog[pair]["columns"], capacity)
+            for view in views.values():
+                view.flags.writeable = False
+            self._segments[pair] = (shm, views)
+        return self._segments[pair]
+
+    def version(self, pair: str) -> int:
+        """Version counter of a pair, increased by every append"""
+        return int(_header(self._segment(pair)[0])[0])
+
+    def read(self, pair: str) -> dict:
+        """Get read-only views (no data copied) of the rows of a pair.
+
+        Returns:
+            a dict with the version of the data, and an array per column
+            (including "date").
+        """
+        shm, views = self._segment(pair)
+        version, length = self._consistent_read(shm, lambda header: int(header[1]))
+        output = {name: view[:length] for name, view in views.items()}
+        output["version"] = version
+        return output
+
+    def read_dataframe(self, pair: str) -> pd.DataFrame:
+        """Get the rows of a pair as a dataframe, as `load_csv_data` would"""
+        data = self.read(pair)
+        data.pop("version")
+        data["date"] = data["date"].astype("datetime64[ns]")
+        return pd.DataFrame(data)
+
+    def close(self) -> None:
+        """Detach from the store. The arrays returned by `read` must be
+        released before."""
+        segments, self._segments = self._segments, {}
+        for shm, views in segments.values():
+            views.clear()
+            shm.close()
+        self._catalog_shm.close()
@@ -0,0 +1,351 @@
+from datetime import date
+import numpy as np
+
+from algorithm.stat_methods import calc_annual_realised_vols
+from algorithm.term_structure import VolTermStructure, DAYS_IN_YEAR, to_days
+from algorithm.trade_classes import (
+    VarianceSwap,
+    calc_varswap_mtm,
+    calc_varswap_greeks,
+)
+
+
+class Scenarios:
+    """Market scenarios as shocks to the implied vol term structure
+    (per tenor), to the spot (as a log return) and to the rate.
+    All the shocks are additive and have a row per scenario."""
+
+    def __init__(
+        self,
+        vol_shocks: np.ndarray,
+        spot_shocks: np.ndarray = None,
+        rate_shocks: np.ndarray = None,
+    ) -> None:
+        """Args:
+        vol_shocks: an array of shape (n_scenarios, n_tenors).
+        Kwargs:
+            spot_shocks (default: no shocks) - an array of shape (n_scenarios,)
+            rate_shocks (default: no shocks) - an array of shape (n_scenarios,)
+        """
+        self._vol_shocks = np.atleast_2d(np.asarray(vol_shocks, dtype=float))
+        n = self._vol_shocks.shape[0]
+        self._spot_shocks = (
+            np.zeros(n) if spot_shocks is None else np.asarray(spot_shocks, dtype=float)
+        )
+        self._rate_shocks = (
+            np.zeros(n) if rate_shocks is None else np.asarray(rate_shocks, dtype=float)
+        )
+        if self._spot_shocks.shape != (n,) or self._rate_shocks.shape != (n,):
+            raise ValueError(f"spot_shocks and rate_shocks must be of shape {(n,)}")
+
+    def __len__(self) -> int:
+        return self._vol_shocks.shape[0]
+
+    def __add__(self, other: "Scenarios") -> "Scenarios":
+        """Concatenate the scenarios of both sets"""
+        return Scenarios(
+            np.concatenate([self.vol_shocks, other.vol_shocks]),
+            np.concatenate([self.spot_shocks, other.spot_shocks]),
+            np.concatenate([self.rate_shocks, other.rate_shocks]),
+        )
+
+    @classmethod
+    def parallel_shifts(cls, shifts, n_tenors: int) -> "Scenarios":
+        """A scenario per shift of all the tenors by the same vol"""
+        shifts = np.asarray(shifts, dtype=float)
+        return cls(np.repeat(shifts[:, np.newaxis], n_tenors, axis=1))
+
+    @classmethod
+    def twists(cls, twists, tenors, pivot: float) -> "Scenarios":
+        """A scenario per twist of the term structure around a pivot
+        tenor. Each tenor T is shifted by twist * (T - pivot)."""
+        twists = np.asarray(twists, dtype=float)
+        tenors = np.asarray(tenors, dtype=float)
+        return cls(twists[:, np.newaxis] * (tenors - pivot))
+
+    @classmethod
+    def spot_moves(cls, log_returns, n_tenors: int) -> "Scenarios":
+        """A scenario per spot move, with no vol shocks"""
+        log_returns = np.asarray(log_returns, dtype=float)
+        return cls(np.zeros([len(log_returns), n_tenors]), spot_shocks=log_returns)
+
+    @classmethod
+    def historical(
+        cls, term_structure: VolTermStructure, spots: np.ndarray, horizon: int = 1
+    ) -> "Scenarios":
+        """A scenario per historical change of the vols and spot over
+        horizon observations. The changes with missing data are dropped.
+
+        Args:
+            term_structure: the historical implied vol term structure.
+            spots: the spot levels at the dates of the term structure.
+        """
+        vols = term_structure.vols
+        spots = np.asarray(spots, dtype=float)
+        vol_shocks = vols[horizon:] - vols[:-horizon]
+        spot_shocks = np.log(spots[horizon:] / spots[:-horizon])
+        valid = ~(np.isnan(vol_shocks).any(axis=1) | np.isnan(spot_shocks))
+        return cls(vol_shocks[valid], spot_shocks[valid])
+
+    @property
+    def vol_shocks(self):
+        return self._vol_shocks
+
+    @property
+    def spot_shocks(self):
+        return self._spot_shocks
+
+    @property
+    def rate_shocks(self):
+        return self._rate_shocks
+
+
+def _shock_term_structure(
+    term_structure: VolTermStructure, valuation_date: date, vol_shocks: np.ndarray
+) -> VolTermStructure:
+    """A term structure with a row per shock to the vols at valuation_date"""
+    rows = np.flatnonzero(term_structure.dates == to_days(valuation_date))
+    if not len(rows):
+        raise ValueError(f"No vols in the term structure at {valuation_date}")
+    vols = np.maximum(term_structure.vols[rows[-1]] + vol_shocks, 0)
+    return VolTermStructure(
+        np.repeat(to_days(valuation_date), len(vols)), term_structure.tenors, vols
+    )
+
+
+class VarianceSwapBook:
+    """A book of variance swaps held as arrays, so that the whole book
+    is valued, and its risk calculated, in array operations."""
+
+    def __init__(self, trades: list) -> None:
+        """Args:
+        trades: a list of `VarianceSwap`s. Sold swaps have negative
+            variance notionals in the book.
+        """
+        self._trades = list(trades)
+        signs = np.array([1 if trade.direction == "buy" else -1 for trade in trades])
+        self._var_amounts = signs * np.array(
+            [trade.var_amount for trade in trades], dtype=float
+        )
+        self._strikes = np.array([trade.strike for trade in trades], dtype=float)
+        self._trade_dates = to_days([trade.trade_date for trade in trades])
+        self._value_dates = to_days([trade.value_date for trade in trades])
+
+    def __len__(self) -> int:
+        return len(self._trades)
+
+    def calc_year_fractions(self, valuation_date: date) -> tuple:
+        """T and t of every trade (see `VarianceSwap.calc_year_fractions`)"""
+        T = ((self._value_dates - self._trade_dates).astype(float) - 1) / DAYS_IN_YEAR
+        t = (
+            (to_days(valuation_date) - self._trade_dates).astype(float) - 1
+        ) / DAYS_IN_YEAR
+        return T, t
+
+    def live(self, valuation_date: date) -> np.ndarray:
+        """Mask of the trades traded before and maturing after valuation_date"""
+        valuation_date = to_days(valuation_date)
+        return (self._trade_dates < valuation_date) & (
+            valuation_date < self._value_dates
+        )
+
+    def calc_fair_strikes(
+        self,
+        term_structure: VolTermStructure,
+        valuation_date: date,
+        skew_slope: float = 0,
+        vol_shocks: np.ndarray = None,
+    ) -> np.ndarray:
+        """Fair strikes for the remaining life of every trade, interpolated
+        from the term structure at valuation_date.
+
+        Kwargs:
+            skew_slope (default: 0) - see `VarianceSwap.estimate_fair_strike`
+            vol_shocks (default: None) - An array of shape (n_scenarios,
+                n_tenors) of shocks to the term structure.
+        Returns:
+            an array of shape (n_trades,), or (n_scenarios, n_trades)
+            when vol shocks are given.
+        """
+        shocks = (
+            np.zeros([1, len(term_structure.tenors)])
+            if vol_shocks is None
+            else vol_shocks
+        )
+        scenario_term_structure = _shock_term_structure(
+            term_structure, valuation_date, shocks
+        )
+        T, t = self.calc_year_fractions(valuation_date)
+        fair_strikes = VarianceSwap.estimate_fair_strike(
+            scenario_term_structure,
+            T=np.broadcast_to(T - t, (len(shocks), len(T))),
+            skew_slope=skew_slope,
+        )
+        return fair_strikes[0] if vol_shocks is None else fair_strikes
+
+    def calc_mtm(
+        self,
+        realised_vols: np.ndarray,
+        fair_strikes: np.ndarray,
+        r: float,
+        valuation_date: date,
+    ) -> np.ndarray:
+        """Mark-to-market of every trade (see `VarianceSwap.calc_mtm`).
+        The market data can have leading scenario axes, e.g. fair
+        strikes of shape (n_scenarios, n_trades). Trades that are not
+        live at valuation_date are valued at 0."""
+        T, t = self.calc_year_fractions(valuation_date)
+        mtm = calc_varswap_mtm(
+            self._var_amounts, self._strikes, T, t, realised_vols, fair_strikes, r
+        )
+        return np.where(self.live(valuation_date), mtm, 0)
+
+    def calc_mtm_history(
+        self,
+        term_structure: VolTermStructure,
+        levels: np.ndarray,
+        r: float,
+        skew_slope=0,
+        linear_skew: bool = True,
+    ) -> tuple:
+        """Mark-to-market of every trade at every date of the term
+        structure at which it is live, in one batch. Only the live
+        (trade, date) pairs are valued (see `VolTermStructure.live_rows`).
+
+        Args:
+            term_structure: the implied vol term structure.
+            levels: the underlying levels at the dates of the term
+                structure, from which the realised vols since trade
+                date are calculated (see `calc_annual_realised_vol`).
+            r: the annualised, continuously compounded discount rate.
+        Kwargs:
+            skew_slope, linear_skew - see
+                `VarianceSwap.estimate_remaining_fair_strikes`
+        Returns:
+            a tuple with the rows of the live dates, the realised vols
+            and the MTMs, all of shape (n_trades, max_live_rows). The
+            realised vols and MTMs are NaN outside the live dates.
+        """
+        rows, fair_strikes = VarianceSwap.estimate_remaining_fair_strikes(
+            term_structure,
+            self._trade_dates,
+            self._value_dates,
+            skew_slope=skew_slope,
+            linear_skew=linear_skew,
+        )
+        live = ~np.isnan(fair_strikes)
+        realised_vols = calc_annual_realised_vols(levels, rows[:, :1], rows)
+        realised_vols = np.where(live, realised_vols, np.NaN)
+        T = ((self._value_dates - self._trade_dates).astype(float) - 1) / DAYS_IN_YEAR
+        t = (
+            (term_structure.dates[rows] - self._trade_dates[:, np.newaxis]).astype(
+                float
+            )
+            - 1
+        ) / DAYS_IN_YEAR
+        mtms = calc_varswap_mtm(
+            self._var_amounts[:, np.newaxis],
+            self._strikes[:, np.newaxis],
+            T[:, np.newaxis],
+            t,
+            realised_vols,
+            fair_strikes,
+            r,
+        )
+        return rows, realised_vols, mtms
+
+    def calc_greeks(
+        self,
+        realised_vols: np.ndarray,
+        fair_strikes: np.ndarray,
+        r: float,
+        valuation_date: date,
+    ) -> dict:
+        """Sensitivities of every trade (see `calc_varswap_greeks`).
+        Trades that are not live at valuation_date have no risk."""
+        T, t = self.calc_year_fractions(valuation_date)
+        greeks = calc_varswap_greeks(
+            self._var_amounts, self._strikes, T, t, realised_vols, fair_strikes, r
+        )
+        live = self.live(valuation_date)
+        return {name: np.where(live, greek, 0) for name, greek in greeks.items()}
+
+    def reprice(
+        self,
+        scenarios: Scenarios,
+        term_structure: VolTermStructure,
+        realised_vols: np.ndarray,
+        r: float,
+        valuation_date: date,
+        skew_slope: float = 0,
+        by_trade: bool = False,
+    ) -> np.ndarray:
+        """Reprice the book under every scenario.
+
+        The spot shock of a scenario is a move on valuation_date, which
+        adds its squared log return to the variance realised so far.
+
+        Args:
+            scenarios: the scenarios to reprice.
+            term_structure: the implied vol term structure, including
+                the valuation date.
+            realised_vols: the annualised realised vol of every trade
+                from its trade date to valuation_date.
+            r: the annualised, continuously compounded discount rate.
+            valuation_date: the valuation date.
+        Kwargs:
+            skew_slope (default: 0) - see `VarianceSwap.estimate_fair_strike`
+            by_trade (default: False) - True to return the value of every
+                trade, of shape (n_scenarios, n_trades), instead of the value
+                of the book of shape (n_scenarios,). The book value only
+                reprices the distinct remaining lives of the trades, so it
+                needs far less memory for large books.
+        """
+        T, t = self.calc_year_fractions(valuation_date)
+        live = self.live(valuation_date)
+        realised_vars = np.where(live, np.square(realised_vols), 0)
+        if by_trade:
+            fair_strikes = self.calc_fair_strikes(
+                term_structure, valuation_date, skew_slope, scenarios.vol_shocks
+            )
+            rates = r + scenarios.rate_shocks[:, np.newaxis]
+            mtm = self.calc_mtm(
+                np.sqrt(realised_vars), fair_strikes, rates, valuation_date
+            )
+            # The spot shock adds N * shock² / T, as in the book value below
+            spot_legs = np.where(live, self._var_amounts / T, 0) * np.exp(
+                -rates * (T - t)
+            )
+            return mtm + np.square(scenarios.spot_shocks)[:, np.newaxis] * spot_legs
+
+        # The value of a book is linear in the realised and fair variances,
+        # so the live trades are aggregated by remaining life and only the
+        # distinct remaining lives are repriced under every scenario.
+        τ, bucket = np.unique((T - t)[live], return_inverse=True)
+        N, T, t = self._var_amounts[live], T[live], t[live]
+        n_buckets = len(τ)
+
+        def bucket_sum(values):
+            return np.bincount(bucket, weights=values, minlength=n_buckets)
+
+        realised_legs = bucket_sum(N * t / T * realised_vars[live])
+        spot_legs = bucket_sum(N / T)
+        fair_legs = bucket_sum(N * (T - t) / T)
+        strike_legs = bucket_sum(N * np.square(self._strikes[live]))
+
+        scenario_term_structure = _shock_term_structure(
+            term_structure, valuation_date, scenarios.vol_shocks
+        )
+        fair_strikes = VarianceSwap.estimate_fair_strike(
+            scenario_term_structure,
+            T=np.broadcast_to(τ, (len(scenarios), n_buckets)),
+            skew_slope=skew_slope,
+        )
+        discounts = np.exp(-(r + scenarios.rate_shocks[:, np.newaxis]) * τ)
+        values = discounts * (
+            realised_legs
+            + np.square(scenarios.spot_shocks)[:, np.newaxis] * spot_legs
+            + np.square(fair_strikes) * fair_legs
+            - strike_legs
+        )
+        return values.sum(axis=1)
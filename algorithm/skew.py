@@ -0,0 +1,148 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+from algorithm.utils import smile_colnames
+
+# Smile pillars as signed forward deltas (puts are negative). ATMF is 0.
+PILLAR_DELTAS = np.array([-0.10, -0.25, 0.0, 0.25, 0.10])
+PILLAR_D1 = np.array(
+    [NormalDist().inv_cdf(d + 1 if d < 0 else d) if d else 0.0 for d in PILLAR_DELTAS]
+)
+
+
+def reconstruct_smile(
+    atm: np.ndarray,
+    rr_25: np.ndarray,
+    bf_25: np.ndarray,
+    rr_10: np.ndarray = None,
+    bf_10: np.ndarray = None,
+) -> np.ndarray:
+    """Reconstruct the vols at the delta pillars from market quotes.
+
+    The pillars are ordered as in `PILLAR_DELTAS` (10D put, 25D put,
+    ATMF, 25D call, 10D call). The quotes can be arrays of any shape
+    (e.g. (n_dates, n_tenors)), and must be in the same units.
+    If the 10D quotes are not provided, their pillars are NaN.
+
+    Returns:
+        an array of shape atm.shape + (5,)
+    """
+    atm = np.asarray(atm, dtype=float)
+    nan = np.full(atm.shape, np.nan)
+    rr_10 = nan if rr_10 is None else rr_10
+    bf_10 = nan if bf_10 is None else bf_10
+    return np.stack(
+        [
+            atm + bf_10 - np.divide(rr_10, 2),
+            atm + bf_25 - np.divide(rr_25, 2),
+            atm,
+            atm + bf_25 + np.divide(rr_25, 2),
+            atm + bf_10 + np.divide(rr_10, 2),
+        ],
+        axis=-1,
+    )
+
+
+def calc_log_moneyness(smile: np.ndarray, T) -> np.ndarray:
+    """Calculate ln(K/F) of the pillars of a smile from their forward deltas.
+
+    Args:
+        smile: an array of vols (in decimals) at the pillars as
+            returned by `reconstruct_smile`.
+        T: the tenor in years. Either a scalar or an array that
+            broadcasts with smile.shape[:-1].
+    """
+    vol_sqrt_T = smile * np.sqrt(np.asarray(T, dtype=float))[..., np.newaxis]
+    return -PILLAR_D1 * vol_sqrt_T + vol_sqrt_T ** 2 / 2 * (PILLAR_DELTAS != 0)
+
+
+def estimate_skew_slopes(smile: np.ndarray, T, linear_skew: bool = True) -> np.ndarray:
+    """Estimate the skew slope of every smile by least squares.
+
+    The slope follows the sign convention of
+    `VarianceSwap.estimate_fair_strike`, i.e. it is positive when
+    the vols increase for lower strikes. The missing pillars (NaN)
+    of each smile are ignored.
+
+    Args:
+        smile: an array of vols (in decimals) at the pillars as
+            returned by `reconstruct_smile`.
+        T: the tenor in years (see `calc_log_moneyness`).
+    Kwargs:
+        linear_skew (default: True): False to estimate the slope
+            against the log-moneyness ln(K/F) instead of K/F.
+    Returns:
+        an array of shape smile.shape[:-1]
+    """
+    x = calc_log_moneyness(smile, T)
+    if linear_skew:
+        x = np.exp(x) - 1
+    mask = ~(np.isnan(x) | np.isnan(smile))
+    n = mask.sum(axis=-1)
+    x = np.where(mask, x, 0)
+    y = np.where(mask, smile, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = x.sum(axis=-1) / n
+        y_mean = y.sum(axis=-1) / n
+        dx = np.where(mask, x - x_mean[..., np.newaxis], 0)
+        dy = np.where(mask, y - y_mean[..., np.newaxis], 0)
+        slopes = -(dx * dy).sum(axis=-1) / (dx ** 2).sum(axis=-1)
+    return np.where(n >= 2, slopes, np.nan)
+
+
+def smile_from_dataframe(
+    df: pd.DataFrame, tenors: list, scale: float = 1
+) -> np.ndarray:
+    """Reconstruct the smiles of every date and tenor from a dataframe
+    loaded with the file defs of `smile_file_defs`.
+
+    Args:
+        df: a dataframe as returned by `load_csv_data`.
+        tenors: the tenor labels (e.g. ["1m", "1y"]).
+    Kwargs:
+        scale (default: 1): factor applied to the quotes (e.g. 0.01
+            for quotes in %).
+    Returns:
+        an array of shape (n_dates, n_tenors, 5). The 10D pillars
+        are NaN for tenors with no 10D quotes loaded.
+    """
+    quotes = {}
+    for key in ("atm", "rr_25", "bf_25", "rr_10", "bf_10"):
+        colnames = [smile_colnames(tenor)[key] for tenor in tenors]
+        quotes[key] = np.stack(
+            [
+                np.array(df[col], dtype=float) * scale
+                if col in df
+                else np.full(df.shape[0], np.nan)
+                for col in colnames
+            ],
+            axis=-1,
+        )
+    return reconstruct_smile(**quotes)
+
+
+def interpolate_skew_slopes(tenors, slopes: np.ndarray, maturities) -> np.ndarray:
+    """Interpolate the skew slopes of every date linearly in maturity
+    (flat outside the tenors).
+
+    Args:
+        tenors: the sorted tenors in years of the columns of slopes.
+        slopes: an array of shape (n_dates, n_tenors).
+        maturities: a scalar or an array with n_dates rows
+            (e.g. of shape (n_dates, n_trades)).
+    """
+    tenors = np.asarray(tenors, dtype=float)
+    slopes = np.asarray(slopes, dtype=float).reshape(-1, len(tenors))
+    n = slopes.shape[0]
+    T = np.asarray(maturities, dtype=float)
+    if T.ndim == 0:
+        T = np.full(n, float(T))
+    if len(tenors) == 1:
+        return np.broadcast_to(
+            slopes[:, :1].reshape((n,) + (1,) * (T.ndim - 1)), T.shape
+        ).copy()
+    rows = np.arange(n).reshape((n,) + (1,) * (T.ndim - 1))
+    j = np.clip(np.searchsorted(tenors, T, side="right") - 1, 0, len(tenors) - 2)
+    weight = np.clip((T - tenors[j]) / (tenors[j + 1] - tenors[j]), 0, 1)
+    return slopes[rows, j] + weight * (slopes[rows, j + 1] - slopes[rows, j])
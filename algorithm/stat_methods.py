@@ -2,53 +2,237 @@ from typing import Any
 import numpy as np
 import math
 
+NAN_POLICIES = ("skip", "ffill", "min_periods")
+
+
+def first_valid_index(arr: np.ndarray) -> int:
+    """Get the index of the first non-NaN element (None if there is none)"""
+    mask = ~np.isnan(np.asarray(arr, dtype=float))
+    return int(np.argmax(mask)) if mask.any() else None
+
+
+def forward_fill(arr: np.ndarray, axis: int = 0) -> np.ndarray:
+    """Replace each NaN with the last non-NaN value before it along
+    axis. Leading NaNs are kept."""
+    arr = np.moveaxis(np.asarray(arr, dtype=float), axis, 0)
+    steps = np.arange(len(arr)).reshape((-1,) + (1,) * (arr.ndim - 1))
+    indexes = np.where(np.isnan(arr), 0, steps)
+    np.maximum.accumulate(indexes, axis=0, out=indexes)
+    return np.moveaxis(np.take_along_axis(arr, indexes, axis=0), 0, axis)
+
+
+def _apply_nan_policy(arr: np.ndarray, nan_policy: str) -> tuple:
+    """Get the values the windows are rolled over (along the first axis),
+    and their positions in the original array."""
+    if nan_policy not in NAN_POLICIES:
+        raise ValueError(f"nan_policy must be an allowed policy {NAN_POLICIES}")
+    arr = np.asarray(arr, dtype=float)
+    if nan_policy == "skip":
+        if arr.ndim > 1:
+            raise ValueError('The "skip" nan_policy only applies to 1-D arrays')
+        positions = np.flatnonzero(~np.isnan(arr))
+        return arr[positions], positions
+    elif nan_policy == "ffill":
+        return forward_fill(arr), np.arange(len(arr))
+    return arr, np.arange(len(arr))
+
+
+def _sliding_windows(arr: np.ndarray, window_size: int) -> np.ndarray:
+    """A read-only 2-D view with a row per window (no data copied)"""
+    n = len(arr) - window_size + 1
+    stride = arr.strides[0]
+    windows = np.lib.stride_tricks.as_strided(
+        arr, shape=(n, window_size), strides=(stride, stride)
+    )
+    windows.flags.writeable = False
+    return windows
+
+
+def rolling_apply(
+    arr: np.ndarray,
+    window_size: int,
+    func: callable,
+    nan_policy: str = "skip",
+    min_periods: int = None,
+    fill_value: float = np.NaN,
+) -> np.ndarray:
+    """Apply a vectorized function to every rolling window of an array.
+
+    Missing observations (NaN) are handled according to nan_policy:
+        "skip": the NaNs are removed before rolling, so each window
+            holds the last window_size observations. The outputs at
+            the positions of NaNs are fill_value.
+        "ffill": the NaNs are forward-filled before rolling.
+        "min_periods": the windows are positional and the NaNs
+            inside them are masked out.
+
+    Args:
+        arr: a 1-D array.
+        window_size: the number of elements in each window.
+        func: a function taking an array of shape (n_windows, window_size)
+            with the windows, and a boolean array of the same shape with
+            the mask of valid (non-NaN) elements. It must return an
+            array with a value per window.
+    Kwargs:
+        nan_policy (str, default: "skip") - One of `NAN_POLICIES`
+        min_periods (int, default: window_size) - Minimum number of valid
+            observations in a window to produce a value.
+        fill_value (float, default: NaN) - Value of the outputs with
+            no complete window.
+    Returns:
+        an array of the same length as arr, where each output is
+        aligned with the last element of its window.
+    """
+    values, positions = _apply_nan_policy(arr, nan_policy)
+    output = np.full(len(arr), fill_value, dtype=float)
+    if len(values) < window_size:
+        return output
+    windows = _sliding_windows(np.ascontiguousarray(values), window_size)
+    mask = ~np.isnan(windows)
+    results = np.asarray(func(windows, mask), dtype=float)
+    min_periods = window_size if min_periods is None else min_periods
+    results[mask.sum(axis=1) < min_periods] = fill_value
+    output[positions[window_size - 1 :]] = results
+    return output
+
+
+def _rolling_sums(arr: np.ndarray, window_size: int, nan_policy: str) -> tuple:
+    """Sums and counts of the valid observations of the windows rolled
+    along the first axis, in O(n) with cumulative sums, and the positions
+    of the rolled values (see `_apply_nan_policy`). The sums and counts
+    are None when there is no complete window."""
+    values, positions = _apply_nan_policy(arr, nan_policy)
+    if len(values) < window_size:
+        return None, None, positions
+    mask = ~np.isnan(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    cum_sums = np.concatenate([zeros, np.cumsum(np.where(mask, values, 0), axis=0)])
+    cum_counts = np.concatenate([zeros, np.cumsum(mask, axis=0)])
+    sums = cum_sums[window_size:] - cum_sums[:-window_size]
+    counts = cum_counts[window_size:] - cum_counts[:-window_size]
+    return sums, counts, positions
+
+
+def rolling_sum(
+    arr: np.ndarray,
+    window_size: int,
+    nan_policy: str = "skip",
+    min_periods: int = None,
+    fill_value: float = np.NaN,
+    axis: int = 0,
+) -> np.ndarray:
+    """Rolling sum of an array, in O(n) with cumulative sums.
+    See `rolling_apply` for the args.
+
+    Kwargs:
+        axis (int, default: 0) - The axis the windows are rolled along,
+            e.g. the days of a panel of shape (n_days, n_series). Arrays
+            of more than 1 dimension require the "ffill" or "min_periods"
+            nan_policy.
+    """
+    arr = np.moveaxis(np.asarray(arr, dtype=float), axis, 0)
+    output = np.full(arr.shape, fill_value, dtype=float)
+    sums, counts, positions = _rolling_sums(arr, window_size, nan_policy)
+    if sums is not None:
+        min_periods = window_size if min_periods is None else min_periods
+        sums[counts < min_periods] = fill_value
+        output[positions[window_size - 1 :]] = sums
+    return np.moveaxis(output, 0, axis)
+
+
+def rolling_mean(
+    arr: np.ndarray,
+    window_size: int,
+    nan_policy: str = "skip",
+    min_periods: int = None,
+    fill_value: float = np.NaN,
+    axis: int = 0,
+) -> np.ndarray:
+    """Rolling mean of the valid observations of an array, in O(n)
+    with cumulative sums. See `rolling_sum` for the args."""
+    arr = np.moveaxis(np.asarray(arr, dtype=float), axis, 0)
+    output = np.full(arr.shape, fill_value, dtype=float)
+    sums, counts, positions = _rolling_sums(arr, window_size, nan_policy)
+    if sums is not None:
+        min_periods = window_size if min_periods is None else min_periods
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        means[(counts < min_periods) | (counts == 0)] = fill_value
+        output[positions[window_size - 1 :]] = means
+    return np.moveaxis(output, 0, axis)
+
 
 def calc_log_returns(levels: np.ndarray, window_size: int = 1):
-    n = len(levels)
-    levels_t_minus_s = np.zeros(n)
-    levels_t_minus_s[window_size:] = levels[:-window_size]
-    return np.log((levels / levels_t_minus_s)[window_size:])
+    """Log returns over window_size elements. Returns involving a
+    missing level are NaN."""
+    levels = np.asarray(levels, dtype=float)
+    return np.log(levels[window_size:] / levels[:-window_size])
 
 
 def calc_annual_realised_vol(levels: np.ndarray) -> np.ndarray:
+    """Annualised realised vol of a series of levels. Missing levels
+    are skipped."""
+    levels, _ = _apply_nan_policy(levels, "skip")
     n = len(levels)
     log_returns = calc_log_returns(levels)
     return math.sqrt(252 * np.matmul(log_returns, log_returns.T) / n)
 
 
-def sum_squares_moving_window(arr: np.ndarray, window_size: int) -> np.ndarray:
-    n = len(arr)
-    transition_matrix = np.zeros([n, n])
-    i = 0
-    while i <= n - window_size:
-        transition_matrix[window_size + i - 1, i : window_size + i] = arr[
-            i : window_size + i
-        ]
-        i += 1
-    return np.matmul(transition_matrix, arr)
+def calc_annual_realised_vols(
+    levels: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    """Annualised realised vols of the levels in many windows at once
+    (see `calc_annual_realised_vol`), from the cumulative sum of the
+    squared log returns. Missing levels are skipped.
+
+    Args:
+        levels: the levels.
+        starts, ends: arrays of the same shape with the first and last
+            index (inclusive) of each window in levels.
+    Returns:
+        an array of the shape of starts, NaN for windows without levels.
+    """
+    levels = np.asarray(levels, dtype=float)
+    positions = np.flatnonzero(~np.isnan(levels))
+    log_returns = calc_log_returns(levels[positions])
+    cum_squares = np.concatenate([[0], np.cumsum(np.square(log_returns))])
+    first = np.searchsorted(positions, starts, side="left")
+    last = np.searchsorted(positions, ends, side="right") - 1
+    counts = last - first + 1
+    valid = counts > 0
+    first, last = np.where(valid, first, 0), np.where(valid, last, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(
+            valid,
+            np.sqrt(252 * (cum_squares[last] - cum_squares[first]) / counts),
+            np.NaN,
+        )
+
+
+def sum_squares_moving_window(
+    arr: np.ndarray, window_size: int, nan_policy: str = "skip"
+) -> np.ndarray:
+    return rolling_sum(np.square(arr), window_size, nan_policy, fill_value=0)
 
 
 def calc_moving_annual_realised_vol(
-    levels: np.ndarray, window_size: int, by_matrix: bool = True
+    levels: np.ndarray, window_size: int, by_matrix: bool = True, nan_policy="skip"
 ) -> np.ndarray:
-    n = len(levels)
-    output = np.zeros(n)
-    output[:] = np.NaN
     if not by_matrix:
-        i = 0
-        while i < n - window_size:
-            in_levels = levels[i : i + window_size + 1]
-            output[i + window_size] = calc_annual_realised_vol(in_levels)
-            i += 1
+
+        def window_vols(windows, mask):
+            log_returns = np.log(windows[:, 1:] / windows[:, :-1])
+            return np.sqrt(252 * np.sum(log_returns ** 2, axis=1) / (window_size + 1))
+
+        output = rolling_apply(levels, window_size + 1, window_vols, nan_policy)
         return output[1:]
     else:
-        levels_t_minus1 = np.zeros(n)
-        levels_t_minus1[1:] = levels[:-1]
-        log_returns = np.log((levels / levels_t_minus1)[1:])
-        summed_squares = sum_squares_moving_window(log_returns, window_size)
-        output[window_size:] = np.sqrt(252 * summed_squares / (window_size + 1))[
-            window_size - 1 :
-        ]
+        values, positions = _apply_nan_policy(levels, nan_policy)
+        output = np.full(len(levels), np.NaN)
+        summed_squares = rolling_sum(
+            np.square(calc_log_returns(values)), window_size, "min_periods"
+        )
+        output[positions[1:]] = np.sqrt(252 * summed_squares / (window_size + 1))
         return output[1:]
 
 
@@ -56,30 +240,43 @@ def calc_percentile(arr: np.ndarray, value: float) -> float:
     return sum(arr < value) / float(len(arr))
 
 
-def calc_moving_percentile(arr: np.ndarray, window_size: int) -> np.ndarray:
-    n = len(arr)
-    output = np.zeros(n)
-    output[:] = np.NaN
-    i = 0
-    while i <= n - window_size:
-        in_arr = arr[i : i + window_size]
-        value = arr[i + window_size - 1]
-        output[i + window_size - 1] = calc_percentile(in_arr, value)
-        i += 1
-    return output
+def calc_moving_percentile(
+    arr: np.ndarray, window_size: int, nan_policy: str = "skip", min_periods: int = None
+) -> np.ndarray:
+    def window_percentiles(windows, mask):
+        values = windows[:, -1:]
+        with np.errstate(invalid="ignore"):
+            below = np.sum(mask & (windows < values), axis=1)
+            return np.where(mask[:, -1], below / mask.sum(axis=1), np.NaN)
+
+    return rolling_apply(arr, window_size, window_percentiles, nan_policy, min_periods)
 
 
 def forecast_ema_vol(
-    levels: np.ndarray, vol_0: float, window_size: int = 1, _lambda: float = 0.9
+    levels: np.ndarray,
+    vol_0: float,
+    window_size: int = 1,
+    _lambda: float = 0.9,
+    nan_policy: str = "skip",
 ) -> np.ndarray:
-    log_returns = calc_log_returns(levels, window_size)
+    """EMA forecast of the vol of the window_size log returns. The
+    forecast at each level only uses the returns ending at or before it:
+    it starts from vol_0 at level window_size - 1 (NaN before), and is
+    updated with each return at the level the return ends at."""
+    values, positions = _apply_nan_policy(levels, nan_policy)
+    log_returns = calc_log_returns(values, window_size)
     σ_0 = vol_0
     λ = _lambda
-    ema_vols = np.zeros(len(levels))
+    ema_vols = np.full(len(log_returns) + 1, np.NaN)
     ema_vols[0] = σ_0
     for i, r in enumerate(log_returns):
+        if np.isnan(r):  # No new information from a missing level
+            ema_vols[i + 1] = ema_vols[i]
+            continue
         ema_vols[i + 1] = (λ * ema_vols[i] ** 2 + (1 - λ) * r ** 2) ** (0.5)
-    return ema_vols
+    output = np.full(len(levels), np.NaN)
+    output[positions[window_size - 1 :]] = ema_vols[: len(values) - window_size + 1]
+    return output
 
 
 def gridiserFactory(shape: tuple) -> callable:
@@ -105,3 +302,31 @@ def gridiserFactory(shape: tuple) -> callable:
         return tuple([fit_cell(dim, val) for dim, val in enumerate(args)])
 
     return gridise
+
+
+def gridise_arrays(shape: tuple, *arrays: np.ndarray) -> tuple:
+    """Vectorized version of the gridiser from `gridiserFactory`.
+
+    Args:
+        shape: the grid shape as passed to `gridiserFactory`.
+        arrays: an array of values per axis of the grid.
+    Returns:
+        a tuple with an array of cell indexes per axis.
+    """
+    if len(arrays) != len(shape):
+        raise TypeError(
+            f"This gridiser accepts {len(shape)} parameters; "
+            f"{len(arrays)} were provided."
+        )
+    cells = []
+    for dim, vals in enumerate(arrays):
+        vals = np.asarray(vals, dtype=float)
+        divisions = shape[dim]["divisions"]
+        max_val, min_val = shape[dim]["max"], shape[dim]["min"]
+        if np.any((vals > max_val) | (vals < min_val)):
+            raise ValueError(f"Value out of bounds in axis {dim}")
+        normalised_vals = (vals - min_val) / (max_val - min_val)
+        edges = [1 / divisions * (i + 1) for i in range(divisions)]
+        indexes = np.searchsorted(edges, normalised_vals, side="right")
+        cells.append(np.minimum(indexes, divisions - 1))
+    return tuple(cells)
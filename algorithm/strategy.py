@@ -0,0 +1,316 @@
+from itertools import product
+import numpy as np
+import pandas as pd
+
+
+class RuleSet:
+    """A set of threshold trading rules, evaluated all at once.
+
+    Each rule sells vega when both the vol percentile and the vol carry
+    are above its sell thresholds, and buys vega when both are below
+    its buy thresholds. The thresholds and vega amounts can be scalars
+    or arrays with a value per rule.
+    """
+
+    def __init__(
+        self,
+        sell_percentile=np.inf,
+        sell_carry=np.inf,
+        buy_percentile=-np.inf,
+        buy_carry=-np.inf,
+        vega_amount=1,
+    ) -> None:
+        params = np.broadcast_arrays(
+            *[
+                np.asarray(param, dtype=float).ravel()
+                for param in (
+                    sell_percentile,
+                    sell_carry,
+                    buy_percentile,
+                    buy_carry,
+                    vega_amount,
+                )
+            ]
+        )
+        (
+            self._sell_percentile,
+            self._sell_carry,
+            self._buy_percentile,
+            self._buy_carry,
+            self._vega_amount,
+        ) = params
+
+    @classmethod
+    def grid(cls, **param_values) -> "RuleSet":
+        """Build a rule per combination of the given parameter values,
+        e.g. `RuleSet.grid(sell_percentile=[0.5, 0.8], sell_carry=[0, 0.01])`"""
+        names = list(param_values)
+        combinations = np.array(list(product(*param_values.values())), dtype=float)
+        return cls(**{name: combinations[:, i] for i, name in enumerate(names)})
+
+    def __len__(self) -> int:
+        return len(self._vega_amount)
+
+    def __getitem__(self, index) -> "RuleSet":
+        """The subset of rules at index (e.g. a slice)"""
+        return RuleSet(
+            self._sell_percentile[index],
+            self._sell_carry[index],
+            self._buy_percentile[index],
+            self._buy_carry[index],
+            self._vega_amount[index],
+        )
+
+    def positions(
+        self, percentiles: np.ndarray, carries: np.ndarray, sizes: np.ndarray = None
+    ) -> np.ndarray:
+        """Calculate the signed vega traded by every rule on every day.
+
+        Args:
+            percentiles: the vol percentile signal, of any shape
+                (e.g. (n_pairs, n_days)). NaN signals do not trade.
+            carries: the vol carry signal, of the same shape.
+        Kwargs:
+            sizes (default: None) - Multipliers of the vega amounts that
+                broadcast with (n_rules,) + percentiles.shape, e.g. a size
+                per day (of the shape of percentiles) to scale the vega with
+                the level of vol, or a size per rule and day. Days with NaN
+                sizes do not trade.
+        Returns:
+            an array of shape (n_rules,) + percentiles.shape with the
+            vega bought (positive) or sold (negative).
+        """
+        percentiles = np.asarray(percentiles, dtype=float)
+        carries = np.asarray(carries, dtype=float)
+        shape = (len(self),) + (1,) * percentiles.ndim
+
+        def param(values):
+            return values.reshape(shape)
+
+        with np.errstate(invalid="ignore"):
+            sell = (percentiles > param(self._sell_percentile)) & (
+                carries > param(self._sell_carry)
+            )
+            buy = (percentiles < param(self._buy_percentile)) & (
+                carries < param(self._buy_carry)
+            )
+        positions = (buy.astype(float) - sell) * param(self._vega_amount)
+        if sizes is not None:
+            positions = positions * np.nan_to_num(np.asarray(sizes, dtype=float))
+        return positions
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "sell_percentile": self._sell_percentile,
+                "sell_carry": self._sell_carry,
+                "buy_percentile": self._buy_percentile,
+                "buy_carry": self._buy_carry,
+                "vega_amount": self._vega_amount,
+            }
+        )
+
+
+def _settled_counts(settlement_indexes: np.ndarray) -> np.ndarray:
+    """Number of swaps of each pair settled on or before every day. The
+    swaps settle in the order they are traded, so these are the first
+    swaps traded."""
+    n_pairs, n_days = settlement_indexes.shape
+    settlements = np.minimum(settlement_indexes, n_days)
+    if (np.diff(settlements, axis=-1) < 0).any() or (
+        settlements <= np.arange(n_days)
+    ).any():
+        raise ValueError(
+            "settlement_indexes must be after the trade days and non-decreasing"
+        )
+    offsets = np.arange(n_pairs)[:, np.newaxis] * (n_days + 1)
+    counts = np.bincount(
+        (settlements + offsets).ravel(), minlength=n_pairs * (n_days + 1)
+    )
+    return np.cumsum(counts.reshape(n_pairs, n_days + 1), axis=-1)[:, :n_days]
+
+
+def _cumsum_at(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Sum of the first counts values along the last axis"""
+    zeros = np.zeros(values.shape[:-1] + (1,), dtype=values.dtype)
+    cum_sums = np.concatenate([zeros, np.cumsum(values, axis=-1)], axis=-1)
+    return np.take_along_axis(cum_sums, np.broadcast_to(counts, values.shape), axis=-1)
+
+
+def _open_sums(values: np.ndarray, settled_counts: np.ndarray) -> np.ndarray:
+    """Sum of the values of the swaps open on every day: all the swaps
+    traded up to the day but the settled ones."""
+    return np.cumsum(values, axis=-1) - _cumsum_at(values, settled_counts)
+
+
+class SimulationResult:
+    """Daily book and P&L series of a strategy simulation. All the
+    arrays are of shape (n_rules, n_pairs, n_days).
+
+    The pnl is realised at settlement. When the open swaps are marked
+    (open_mtm), the portfolio P&L and drawdown include their MTM, and
+    are otherwise on the realised P&L only.
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        exposure: np.ndarray,
+        gross_exposure: np.ndarray,
+        open_trades: np.ndarray,
+        pnl: np.ndarray,
+        open_mtm: np.ndarray = None,
+    ) -> None:
+        self.positions = positions
+        self.exposure = exposure
+        self.gross_exposure = gross_exposure
+        self.open_trades = open_trades
+        self.pnl = pnl
+        self.open_mtm = open_mtm
+
+    @property
+    def portfolio_pnl(self) -> np.ndarray:
+        """Daily P&L aggregated across pairs, of shape (n_rules, n_days)"""
+        return np.diff(self.cumulative_pnl, axis=-1, prepend=0)
+
+    @property
+    def cumulative_pnl(self) -> np.ndarray:
+        """Realised P&L to date plus the MTM of the open swaps (if marked)"""
+        cumulative_pnl = np.cumsum(self.pnl.sum(axis=1), axis=-1)
+        if self.open_mtm is not None:
+            cumulative_pnl += self.open_mtm.sum(axis=1)
+        return cumulative_pnl
+
+    @property
+    def drawdown(self) -> np.ndarray:
+        """Portfolio drawdown from the running peak of the cumulative P&L"""
+        cumulative_pnl = self.cumulative_pnl
+        return (
+            np.maximum.accumulate(np.maximum(cumulative_pnl, 0), axis=-1)
+            - cumulative_pnl
+        )
+
+    def summary(self) -> pd.DataFrame:
+        """Portfolio level statistics with a row per rule"""
+        return pd.DataFrame(
+            {
+                "pnl": self.pnl.sum(axis=(1, 2)),
+                "max_drawdown": self.drawdown.max(axis=-1),
+                "avg_gross_exposure": self.gross_exposure.sum(axis=1).mean(axis=-1),
+                "max_open_trades": self.open_trades.sum(axis=1).max(axis=-1),
+                "n_trades": (self.positions != 0).sum(axis=(1, 2)),
+            }
+        )
+
+
+def simulate(
+    rules: RuleSet,
+    percentiles: np.ndarray,
+    carries: np.ndarray,
+    payoffs: np.ndarray,
+    settlement_indexes: np.ndarray,
+    sizes: np.ndarray = None,
+    marks: tuple = None,
+) -> SimulationResult:
+    """Simulate a set of rules on the daily signals of one or more pairs.
+
+    Every day, each rule opens a variance swap with the vega given by
+    `RuleSet.positions`. The swaps stay in the book until their
+    settlement day, when their P&L is realised.
+
+    Args:
+        rules: the rules to simulate.
+        percentiles: the vol percentile signal, of shape (n_days,) or
+            (n_pairs, n_days).
+        carries: the vol carry signal, of the same shape.
+        payoffs: the payoff of buying 1 vega of the swap traded on each
+            day (see `VarianceSwap.payoff`), of the same shape. NaN for
+            swaps that do not mature within the data.
+        settlement_indexes: the index of the day on which the swap traded
+            on each day settles, of the same shape, e.g.
+            `np.searchsorted(dates, value_dates)`. Swaps settling after the
+            last day have an index of n_days. The swaps must settle in the
+            order they are traded.
+    Kwargs:
+        sizes (default: None) - Multipliers of the vega traded by every
+            rule on every day (see `RuleSet.positions`).
+        marks (default: None) - A tuple (mark_indexes, mtms) with the MTM
+            of buying 1 vega of the swap traded on each day, at the days
+            with the given indexes while it is open (see
+            `VarianceSwapBook.calc_mtm_history`). Both arrays are of the
+            shape of the signal plus a trailing axis of marks, with NaN
+            mtms where there is no mark. None to leave the open swaps
+            unmarked, in which case the drawdown is on realised P&L only.
+    """
+    if sizes is not None:
+        # Sizes of the shape of the signals before they become 2-D
+        shape = (len(rules),) + np.shape(percentiles)
+        sizes = np.broadcast_to(sizes, shape).reshape(shape[:1] + (-1, shape[-1]))
+    percentiles = np.atleast_2d(percentiles)
+    carries = np.atleast_2d(carries)
+    payoffs = np.atleast_2d(np.asarray(payoffs, dtype=float))
+    settled_counts = _settled_counts(np.atleast_2d(settlement_indexes))
+    positions = rules.positions(percentiles, carries, sizes)
+
+    exposure = _open_sums(positions, settled_counts)
+    gross_exposure = _open_sums(np.abs(positions), settled_counts)
+    open_trades = _open_sums((positions != 0).astype(np.int32), settled_counts)
+    realised_pnl = _cumsum_at(positions * np.nan_to_num(payoffs), settled_counts)
+    pnl = np.diff(realised_pnl, axis=-1, prepend=0)
+
+    open_mtm = None
+    if marks is not None:
+        mark_indexes, mtms = marks
+        n_pairs, n_days = percentiles.shape
+        mark_indexes = np.asarray(mark_indexes).reshape(n_pairs, n_days, -1)
+        mtms = np.asarray(mtms, dtype=float).reshape(n_pairs, n_days, -1)
+        # The marks are added up by day with a bincount on the flat
+        # (rule, pair, day) index, with an extra day for the missing marks
+        n_flat = positions.shape[0] * n_pairs * (n_days + 1)
+        offsets = np.arange(positions.shape[0] * n_pairs).reshape(
+            positions.shape[:2] + (1,)
+        ) * (n_days + 1)
+        open_mtm = np.zeros(n_flat)
+        for k in range(mtms.shape[-1]):
+            indexes = np.where(np.isnan(mtms[..., k]), n_days, mark_indexes[..., k])
+            open_mtm += np.bincount(
+                (offsets + indexes).ravel(),
+                weights=(positions * np.nan_to_num(mtms[..., k])).ravel(),
+                minlength=n_flat,
+            )
+        open_mtm = open_mtm.reshape(positions.shape[:2] + (n_days + 1,))[..., :-1]
+    return SimulationResult(
+        positions, exposure, gross_exposure, open_trades, pnl, open_mtm
+    )
+
+
+def simulate_summary(
+    rules: RuleSet,
+    percentiles: np.ndarray,
+    carries: np.ndarray,
+    payoffs: np.ndarray,
+    settlement_indexes: np.ndarray,
+    sizes: np.ndarray = None,
+    marks: tuple = None,
+    chunk_size: int = 100,
+) -> pd.DataFrame:
+    """Simulate the rules in chunks of chunk_size rules and only keep the
+    summary of each rule (see `SimulationResult.summary`), so that the
+    memory does not grow with the number of rules. The args are as in
+    `simulate`; sizes with an axis per rule are split in chunks too."""
+    shape = (len(rules),) + np.shape(percentiles)
+    sizes = None if sizes is None else np.broadcast_to(sizes, shape)
+    summaries = []
+    for start in range(0, len(rules), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        result = simulate(
+            rules[chunk],
+            percentiles,
+            carries,
+            payoffs,
+            settlement_indexes,
+            sizes=None if sizes is None else sizes[chunk],
+            marks=marks,
+        )
+        summaries.append(result.summary())
+    return pd.concat(summaries, ignore_index=True)
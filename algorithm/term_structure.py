@@ -0,0 +1,158 @@
+from typing import Iterable
+import numpy as np
+import pandas as pd
+
+DAYS_IN_YEAR = 365
+TENOR_UNITS_IN_YEARS = {
+    "d": 1 / DAYS_IN_YEAR,
+    "w": 7 / DAYS_IN_YEAR,
+    "m": 1 / 12,
+    "y": 1,
+}
+
+
+def tenor_to_years(tenor: str) -> float:
+    """Convert a tenor label (e.g. "1w", "1m", "1y") to years."""
+    label = tenor.strip().lower()
+    unit = label[-1:]
+    if unit not in TENOR_UNITS_IN_YEARS or not label[:-1].isdigit():
+        raise ValueError(f"Unrecognised tenor {tenor}")
+    return int(label[:-1]) * TENOR_UNITS_IN_YEARS[unit]
+
+
+def to_days(dates: Iterable) -> np.ndarray:
+    """Convert dates (datetime, date, Timestamp or datetime64) to datetime64[D]"""
+    return np.asarray(dates, dtype="datetime64[D]")
+
+
+class VolTermStructure:
+    """Implied ATMF volatility term structure for a sequence of dates.
+
+    The vols are held as a 2-D array with a row per date and a column
+    per tenor, so that every date can be interpolated at once. The
+    interpolation is linear in total variance (σ²T) between tenors,
+    and flat in volatility outside the quoted tenors.
+    """
+
+    def __init__(self, dates: Iterable, tenors: Iterable, vols: np.ndarray) -> None:
+        """Args:
+        dates: the dates of each row of vols.
+        tenors: the tenors in years of each column of vols.
+        vols: an array of shape (len(dates), len(tenors)) with the
+            annualised ATMF vols (in decimals, not in %).
+        """
+        self._dates = to_days(dates)
+        tenors = np.asarray(tenors, dtype=float)
+        vols = np.asarray(vols, dtype=float)
+        if vols.ndim == 1:
+            vols = vols.reshape(-1, 1)
+        if vols.shape != (len(self._dates), len(tenors)):
+            raise ValueError(
+                f"vols must be of shape {(len(self._dates), len(tenors))}; "
+                f"{vols.shape} was provided."
+            )
+        if np.any(tenors <= 0):
+            raise ValueError("tenors must be positive")
+        order = np.argsort(tenors)
+        self._tenors = tenors[order]
+        self._vols = vols[:, order]
+        self._variances = self._vols ** 2 * self._tenors
+
+    @classmethod
+    def from_dataframe(
+        cls, df: pd.DataFrame, tenor_colnames: dict, date_colname: str = "date"
+    ) -> "VolTermStructure":
+        """Build a term structure from a dataframe with a column per tenor.
+
+        Args:
+            df: a dataframe as returned by `load_csv_data`.
+            tenor_colnames: a dict with the vol column names as keys and
+                their tenors as values, either in years or as tenor
+                labels (e.g. {"1m_annualised_atmf_vol": "1m"}).
+        Kwargs:
+            date_colname (str, default: "date") - Name of the date column
+        """
+        tenors = [
+            tenor_to_years(tenor) if isinstance(tenor, str) else tenor
+            for tenor in tenor_colnames.values()
+        ]
+        vols = np.array(df[list(tenor_colnames)], dtype=float)
+        return cls(np.array(df[date_colname]), tenors, vols)
+
+    def interpolate(self, maturities, rows: np.ndarray = None) -> np.ndarray:
+        """Interpolate the ATMF vol at the given maturities for every date.
+
+        Args:
+            maturities: the maturities in years. Either a scalar (same
+                maturity for every date), or an array whose first axis
+                has the length of the dates (e.g. shape (n_dates, n_trades)).
+                Non-positive maturities produce NaN.
+        Kwargs:
+            rows (default: None) - An int array of the shape of maturities
+                with the row of the date of each maturity (e.g. as given by
+                `live_rows`), instead of a row per date.
+        Returns:
+            an array with the annualised vols, of shape (n_dates,) for
+            scalar maturities or the shape of maturities otherwise.
+        """
+        n = len(self._dates)
+        T = np.asarray(maturities, dtype=float)
+        if rows is None:
+            if T.ndim == 0:
+                T = np.full(n, float(T))
+            if T.shape[0] != n:
+                raise ValueError(
+                    f"maturities must have {n} rows; {T.shape[0]} provided"
+                )
+            rows = np.arange(n).reshape((n,) + (1,) * (T.ndim - 1))
+        else:
+            T, rows = np.broadcast_arrays(T, np.asarray(rows))
+
+        tenors = self._tenors
+        valid_T = np.where(T > 0, T, np.nan)
+        if len(tenors) == 1:
+            return np.where(np.isnan(valid_T), np.nan, self._vols[rows, 0])
+
+        j = np.clip(
+            np.searchsorted(tenors, valid_T, side="right") - 1, 0, len(tenors) - 2
+        )
+        t_lo, t_hi = tenors[j], tenors[j + 1]
+        w_lo, w_hi = self._variances[rows, j], self._variances[rows, j + 1]
+        with np.errstate(invalid="ignore"):
+            weight = np.clip((valid_T - t_lo) / (t_hi - t_lo), 0, 1)
+            variance = w_lo + weight * (w_hi - w_lo)
+            vols = np.sqrt(variance / np.clip(valid_T, t_lo, t_hi))
+        return np.where(np.isnan(valid_T), np.nan, vols)
+
+    def live_rows(self, trade_dates: Iterable, value_dates: Iterable) -> tuple:
+        """Find the rows of the dates at which each trade is live, i.e.
+        strictly after its trade date and before its value date. The
+        dates of the term structure must be in ascending order.
+
+        Only the live rows are returned, as a band with a row per trade,
+        so the size does not grow with the number of dates.
+
+        Returns:
+            a tuple with two arrays of shape (n_trades, max_live_rows): the
+            rows of the live dates of each trade (padded with its last row)
+            and the mask of the live entries.
+        """
+        first = np.searchsorted(self._dates, to_days(trade_dates), side="right")
+        end = np.searchsorted(self._dates, to_days(value_dates), side="left")
+        width = int(np.max(end - first, initial=0))
+        rows = first[:, np.newaxis] + np.arange(width)
+        live = rows < end[:, np.newaxis]
+        rows = np.minimum(rows, np.maximum(end - 1, first)[:, np.newaxis])
+        return np.minimum(rows, max(len(self._dates) - 1, 0)), live
+
+    @property
+    def dates(self):
+        return self._dates
+
+    @property
+    def tenors(self):
+        return self._tenors
+
+    @property
+    def vols(self):
+        return self._vols
@@ -1,11 +1,13 @@
-from uuid import uuid4
+from uuid import UUID, uuid5, NAMESPACE_URL
 from datetime import date
-import math
 
 import numpy as np
 from algorithm.stat_methods import calc_annual_realised_vol
+from algorithm.term_structure import VolTermStructure, DAYS_IN_YEAR, to_days
+from algorithm.vol_estimators import RealisedVolForecaster
 
 ALLOWED_DIRECTIONS = ("buy", "sell")
+TRADE_ID_NAMESPACE = uuid5(NAMESPACE_URL, "fx-volatility-trading/trades")
 
 
 class Trade:
@@ -21,9 +23,9 @@ class Trade:
         underlying: str,
         trade_date: date,
         value_date: date,
+        trade_id: UUID = None,
         **kwargs,
     ) -> None:
-        self._trade_id = uuid4()
         direction = direction.lower()
         if direction not in ALLOWED_DIRECTIONS:
             raise ValueError(
@@ -34,6 +36,31 @@ class Trade:
         self._trade_date = trade_date
         self._value_date = value_date
         [setattr(self, k, v) for k, v in kwargs.items()]
+        if trade_id is None:
+            trade_id = self.calc_trade_id(
+                type(self).__name__,
+                direction,
+                underlying,
+                trade_date,
+                value_date,
+                **kwargs,
+            )
+        self._trade_id = trade_id
+
+    @staticmethod
+    def calc_trade_id(*fields, **kwargs) -> UUID:
+        """Calculate a deterministic id (UUID5) from the trade fields, so
+        that the same trade gets the same id in every run. Trades with
+        identical fields must be given explicit ids to be told apart."""
+
+        def to_str(value) -> str:
+            if isinstance(value, date):
+                return str(np.datetime64(value, "D"))
+            return str(value)
+
+        names = [to_str(value) for value in fields]
+        names += [f"{k}={to_str(v)}" for k, v in sorted(kwargs.items())]
+        return uuid5(TRADE_ID_NAMESPACE, "|".join(names))
 
     def __str__(self) -> str:
         return f"{self.direction} {self.underlying} | {self.trade_date} - {self.value_date}"
@@ -83,6 +110,7 @@ class VarianceSwap(Trade):
         strike: float,
         vega_amount: float = None,
         var_amount: float = None,
+        trade_id: UUID = None,
     ) -> None:
         if vega_amount is None and var_amount is None:
             raise ValueError("Either _vega_amount or var_amount is required")
@@ -93,6 +121,7 @@ class VarianceSwap(Trade):
             underlying,
             trade_date,
             value_date,
+            trade_id=trade_id,
             _strike=strike,
             _vega_amount=vega_amount,
         )
@@ -118,36 +147,62 @@ class VarianceSwap(Trade):
     ) -> float:
         """Calculate the mark-to-maket.
 
+        All the args can also be arrays of the same shape (e.g. to mark
+        the trade at several valuation dates in one go).
+
         Args:
             realised_vol: The annualised realised volatility from trade date
                 to valuation_date.
             fair_strike: The fair strike of a variance swap of same maturity
                 date as current swap, issued at the same date as current swap.
+                (see `VarianceSwap.estimate_remaining_fair_strikes`)
             r: The annualised, continuously compounded discount rate.
             valuation_date: date at which the mtm is calculated.
         """
-        T = ((self.value_date - self.trade_date).days - 1) / 365
-        t = ((valuation_date - self.trade_date).days - 1) / 365
-        mtm = (
-            self.var_amount
-            * math.exp(-r * (T - t))
-            * (
-                t / T * (realised_vol ** 2)
-                + (T - t) / T * (fair_strike ** 2)
-                - (self.strike ** 2)
-            )
+        T, t = self.calc_year_fractions(valuation_date)
+        return calc_varswap_mtm(
+            self.var_amount, self.strike, T, t, realised_vol, fair_strike, r
         )
-        return mtm
+
+    def calc_greeks(
+        self, realised_vol: float, fair_strike: float, r: float, valuation_date: date
+    ) -> dict:
+        """Calculate the sensitivities of the mark-to-market.
+
+        Args:
+            see `VarianceSwap.calc_mtm`
+        Returns:
+            a dict with the vega, variance_vega, theta and rho
+            (see `calc_varswap_greeks`)
+        """
+        T, t = self.calc_year_fractions(valuation_date)
+        return calc_varswap_greeks(
+            self.var_amount, self.strike, T, t, realised_vol, fair_strike, r
+        )
+
+    def calc_year_fractions(self, valuation_date: date) -> tuple:
+        """Calculate the life T of the trade and the time t elapsed
+        at valuation_date (a date or an array of dates), in years."""
+        T = (self._days_from_trade_date(self.value_date) - 1) / DAYS_IN_YEAR
+        t = (self._days_from_trade_date(valuation_date) - 1) / DAYS_IN_YEAR
+        return T, t
+
+    def _days_from_trade_date(self, dates) -> np.ndarray:
+        return (to_days(dates) - to_days(self.trade_date)).astype(float)
 
     @staticmethod
     def estimate_fair_strike(
-        vol_atmf: float, T: float, skew_slope: float, linear_skew: bool = True
+        vol_atmf, T, skew_slope, linear_skew: bool = True
     ) -> float:
         """Calculate the fair strike that would be traded.
 
+        All the args can be arrays, in which case the fair strikes
+        are calculated element-wise.
+
         Args:
             vol_atmf: At-the-money forward volatility for
-                the duration of the trade.
+                the duration of the trade, or a `VolTermStructure`
+                from which it is interpolated at T for every date.
             T: The duration of the trade in years.
             skew_slope: The slope of the skew curve. If the
                 curve is log-linear, it is the slope of the
@@ -155,13 +210,15 @@ class VarianceSwap(Trade):
         Kwargs:
             linear_skew (default: True): False for log-linear skew
         """
+        if isinstance(vol_atmf, VolTermStructure):
+            vol_atmf = vol_atmf.interpolate(T)
         if linear_skew:
-            return vol_atmf * (1 + 3 * T * skew_slope ** 2) ** 0.5
+            return vol_atmf * (1 + 3 * T * np.square(skew_slope)) ** 0.5
         else:
             # NOTE: Assume the user will calculate the slope
             # numerically and provide the right input
             β = skew_slope
-            return math.sqrt(
+            return np.sqrt(
                 vol_atmf ** 2
                 + β * (vol_atmf ** 3) * T
                 + (β / 2) ** 2
@@ -169,15 +226,81 @@ class VarianceSwap(Trade):
             )
 
     @staticmethod
-    def calc_final_realised_vol(levels: np.ndarray) -> float:
+    def estimate_remaining_fair_strikes(
+        term_structure: VolTermStructure,
+        trade_dates,
+        value_dates,
+        skew_slope=0,
+        linear_skew: bool = True,
+    ) -> tuple:
+        """Calculate the fair strike for the remaining life of many trades
+        at every date at which they are live, i.e. strictly after their
+        trade date and before their value date.
+
+        Args:
+            term_structure: the implied vol term structure.
+            trade_dates: the trade dates of the trades.
+            value_dates: the value dates of the trades.
+        Kwargs:
+            skew_slope (default: 0): The slope of the skew curve. Either
+                a scalar or an array with a slope per date of the term
+                structure.
+            linear_skew (default: True): False for log-linear skew
+        Returns:
+            a tuple with the rows of the live dates and the fair strikes,
+            both of shape (n_trades, max_live_rows) (see
+            `VolTermStructure.live_rows`). The fair strikes are NaN
+            outside the live dates.
+        """
+        rows, live = term_structure.live_rows(trade_dates, value_dates)
+        days = to_days(value_dates)[:, np.newaxis] - term_structure.dates[rows]
+        T = np.where(live, days.astype(float) / DAYS_IN_YEAR, np.NaN)
+        skew_slope = np.asarray(skew_slope, dtype=float)
+        if skew_slope.ndim == 1:
+            skew_slope = skew_slope[rows]
+        vol_atmf = term_structure.interpolate(T, rows=rows)
+        return rows, VarianceSwap.estimate_fair_strike(
+            vol_atmf, T=T, skew_slope=skew_slope, linear_skew=linear_skew
+        )
+
+    @staticmethod
+    def calc_final_realised_vol(
+        levels: np.ndarray,
+        estimator: type = None,
+        open: np.ndarray = None,
+        high: np.ndarray = None,
+        low: np.ndarray = None,
+    ) -> float:
         """Calculates the final realised volatility
 
         Args:
             levels: an array with the daily underlying asset
                 prices. It must contain all the observations
-                from trade inception to trade maturity.
+                from trade inception to trade maturity. Missing
+                (NaN) levels are skipped.
+        Kwargs:
+            estimator (default: None) - A `RealisedVolEstimator` class of
+                `vol_estimators` (e.g. `Parkinson`), evaluated over a single
+                window of all the days. None to use `calc_annual_realised_vol`.
+            open, high, low - The daily opening, high and low levels, for
+                the estimators that require them. The days with a missing
+                (NaN) field are skipped.
         """
-        return calc_annual_realised_vol(levels)
+        if estimator is None:
+            return calc_annual_realised_vol(levels)
+        if issubclass(estimator, RealisedVolForecaster):
+            raise ValueError(f"{estimator.__name__} is not a realised vol estimator")
+        fields = {"close": levels, "open": open, "high": high, "low": low}
+        fields = {
+            name: np.asarray(values, dtype=float)
+            for name, values in fields.items()
+            if values is not None
+        }
+        valid = ~np.any([np.isnan(values) for values in fields.values()], axis=0)
+        fields = {name: values[valid] for name, values in fields.items()}
+        # A window of all the days, whatever the daily variances available
+        window = estimator(window_size=int(valid.sum()), min_periods=1)
+        return float(window.estimate(**fields)[-1, 0])
 
     @property
     def strike(self):
@@ -192,4 +315,56 @@ class VarianceSwap(Trade):
         return self._vega_amount / (2 * self.strike)
 
 
+def calc_varswap_mtm(var_amount, strike, T, t, realised_vol, fair_strike, r):
+    """Calculate the mark-to-market of variance swaps element-wise
+    (see `VarianceSwap.calc_mtm`).
+
+    Args:
+        var_amount: the variance notional (negative for sold swaps).
+        strike: the strike of the swaps.
+        T: the life of the swaps in years.
+        t: the time elapsed since trade date in years.
+        realised_vol, fair_strike, r: see `VarianceSwap.calc_mtm`
+    """
+    return (
+        var_amount
+        * np.exp(-r * (T - t))
+        * (
+            t / T * np.square(realised_vol)
+            + (T - t) / T * np.square(fair_strike)
+            - np.square(strike)
+        )
+    )
+
+
+def calc_varswap_greeks(var_amount, strike, T, t, realised_vol, fair_strike, r) -> dict:
+    """Calculate the sensitivities of the mark-to-market of variance
+    swaps element-wise. The args are as in `calc_varswap_mtm`.
+
+    Returns:
+        a dict with the following arrays:
+            vega: sensitivity to the fair strike (per unit of vol).
+            variance_vega: sensitivity to the squared fair strike.
+            theta: change in value after one calendar day, all else equal.
+            rho: sensitivity to the discount rate.
+    """
+    τ = T - t
+    discount = np.exp(-r * τ)
+    variance_vega = var_amount * discount * τ / T
+    mtm = calc_varswap_mtm(var_amount, strike, T, t, realised_vol, fair_strike, r)
+    return {
+        "vega": 2 * variance_vega * fair_strike,
+        "variance_vega": variance_vega,
+        "theta": (
+            r * mtm
+            + var_amount
+            * discount
+            * (np.square(realised_vol) - np.square(fair_strike))
+            / T
+        )
+        / DAYS_IN_YEAR,
+        "rho": -τ * mtm,
+    }
+
+
 # Implement more trade classes below ...
@@ -0,0 +1,271 @@
+from datetime import date
+from typing import Iterable
+from uuid import UUID
+import mmap
+import os
+import numpy as np
+import pandas as pd
+
+from algorithm.term_structure import to_days
+from algorithm.trade_classes import Trade
+
+EVENT_TYPES = ("open", "mark", "settle")
+# Little-endian records, so that the files are portable across machines
+EVENT_DTYPE = np.dtype(
+    [
+        ("trade_id", "V16"),
+        ("event", "u1"),
+        ("direction", "i1"),
+        ("pair", "S14"),
+        ("date", "<M8[D]"),
+        ("trade_date", "<M8[D]"),
+        ("value_date", "<M8[D]"),
+        ("strike", "<f8"),
+        ("vega_amount", "<f8"),
+        ("realised_vol", "<f8"),
+        ("value", "<f8"),
+    ]
+)
+# The header is the magic, the format version and the record size
+MAGIC = b"FXVOLLOG"
+FORMAT_VERSION = 1
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("itemsize", "<u4")])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+
+def _read_header(filename: str) -> None:
+    with open(filename, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{filename} is not a trade log")
+    header = np.frombuffer(raw, dtype=HEADER_DTYPE)[0]
+    if header["magic"] != MAGIC:
+        raise ValueError(f"{filename} is not a trade log")
+    if (
+        header["version"] != FORMAT_VERSION
+        or header["itemsize"] != EVENT_DTYPE.itemsize
+    ):
+        raise ValueError(
+            f"{filename} has an unsupported format version {header['version']}"
+        )
+
+
+def _write_header(f) -> None:
+    header = np.array([(MAGIC, FORMAT_VERSION, EVENT_DTYPE.itemsize)], HEADER_DTYPE)
+    f.write(header.tobytes())
+
+
+def _set_trade_fields(record: np.void, trade: Trade) -> None:
+    record["trade_id"] = np.void(trade.trade_id.bytes)
+    record["direction"] = 1 if trade.direction == "buy" else -1
+    record["pair"] = trade.underlying
+    record["trade_date"] = to_days(trade.trade_date)
+    record["value_date"] = to_days(trade.value_date)
+    record["strike"] = getattr(trade, "strike", np.NaN)
+    record["vega_amount"] = getattr(trade, "vega_amount", np.NaN)
+
+
+class TradeLogWriter:
+    """Streaming writer of trade events to a binary log of fixed-width
+    records (see `EVENT_DTYPE`).
+
+    The events are buffered and appended to the file every buffer_size
+    events, so a run is never held in memory. Use as a context manager,
+    or call `close` to flush the last events.
+    """
+
+    def __init__(
+        self, filename: str, overwrite: bool = False, buffer_size: int = 10_000
+    ) -> None:
+        """Args:
+        filename: the path of the log. Existing logs are appended to.
+        Kwargs:
+            overwrite (bool, default: False) - True to truncate an
+                existing log
+            buffer_size (int, default: 10_000) - Number of events
+                written at once
+        """
+        self._filename = filename
+        exists = not overwrite and os.path.exists(filename)
+        if exists:
+            _read_header(filename)
+        self._file = open(filename, "ab" if exists else "wb")
+        if not exists:
+            _write_header(self._file)
+        self._buffer = np.zeros(buffer_size, dtype=EVENT_DTYPE)
+        self._n_buffered = 0
+
+    def __enter__(self) -> "TradeLogWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def append(self, records: np.ndarray) -> None:
+        """Append an array of records of dtype `EVENT_DTYPE`"""
+        records = np.asarray(records, dtype=EVENT_DTYPE)
+        if self._n_buffered + len(records) > len(self._buffer):
+            self.flush()
+        if len(records) > len(self._buffer):
+            self._file.write(records.tobytes())
+            return
+        self._buffer[self._n_buffered : self._n_buffered + len(records)] = records
+        self._n_buffered += len(records)
+
+    def log_event(
+        self,
+        event: str,
+        trade: Trade,
+        event_date: date,
+        value: float = np.NaN,
+        realised_vol: float = np.NaN,
+    ) -> None:
+        """Append an event of a trade.
+
+        Args:
+            event: one of `EVENT_TYPES`.
+            trade: the trade, e.g. a `VarianceSwap`.
+            event_date: the date of the event.
+        Kwargs:
+            value - The value of the event, e.g. the MTM of a mark or
+                the payoff of a settlement
+            realised_vol - The realised vol to date of the trade
+        """
+        if self._n_buffered == len(self._buffer):
+            self.flush()
+        record = self._buffer[self._n_buffered]
+        _set_trade_fields(record, trade)
+        record["event"] = EVENT_TYPES.index(event)
+        record["date"] = to_days(event_date)
+        record["realised_vol"] = realised_vol
+        record["value"] = value
+        self._n_buffered += 1
+
+    def log_marks(
+        self,
+        trades: list,
+        mark_dates: np.ndarray,
+        mtms: np.ndarray,
+        realised_vols: np.ndarray = None,
+    ) -> None:
+        """Append the marks of many trades at once, e.g. as calculated by
+        `VarianceSwapBook.calc_mtm_history`.
+
+        Args:
+            trades: the trades.
+            mark_dates: the dates of the marks, of shape (n_trades, n_marks).
+            mtms: the MTMs at the mark dates, of the same shape. The NaN
+                MTMs (no mark) are not logged.
+        Kwargs:
+            realised_vols - The realised vols to date, of the same shape
+        """
+        mtms = np.asarray(mtms, dtype=float)
+        marked = ~np.isnan(mtms)
+        trade_records = np.zeros(len(trades), dtype=EVENT_DTYPE)
+        for record, trade in zip(trade_records, trades):
+            _set_trade_fields(record, trade)
+        records = trade_records[np.nonzero(marked)[0]]
+        records["event"] = EVENT_TYPES.index("mark")
+        records["date"] = to_days(mark_dates)[marked]
+        records["value"] = mtms[marked]
+        records["realised_vol"] = (
+            np.NaN if realised_vols is None else np.asarray(realised_vols)[marked]
+        )
+        self.append(records)
+
+    def log_open(self, trade: Trade) -> None:
+        self.log_event("open", trade, trade.trade_date)
+
+    def log_mark(
+        self, trade: Trade, mark_date: date, mtm: float, realised_vol=np.NaN
+    ) -> None:
+        self.log_event("mark", trade, mark_date, mtm, realised_vol)
+
+    def log_settlement(self, trade: Trade, payoff: float, realised_vol=np.NaN) -> None:
+        self.log_event("settle", trade, trade.value_date, payoff, realised_vol)
+
+    def flush(self) -> None:
+        self._file.write(self._buffer[: self._n_buffered].tobytes())
+        self._file.flush()
+        self._n_buffered = 0
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class TradeLogReader:
+    """Memory-mapped reader of a trade log written by `TradeLogWriter`.
+
+    The file is paged in by the OS as the records are accessed, and
+    only the selected records are copied into memory. Use as a context
+    manager, or call `close` to unmap the file (e.g. before overwriting
+    it); any view of `records` must be released first.
+    """
+
+    def __init__(self, filename: str) -> None:
+        _read_header(filename)
+        n = (os.path.getsize(filename) - HEADER_SIZE) // EVENT_DTYPE.itemsize
+        self._mmap = None
+        self._records = np.zeros(0, dtype=EVENT_DTYPE)
+        if n:
+            with open(filename, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._records = np.frombuffer(
+                self._mmap, dtype=EVENT_DTYPE, count=n, offset=HEADER_SIZE
+            )
+
+    def __enter__(self) -> "TradeLogReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._records = np.zeros(0, dtype=EVENT_DTYPE)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def records(self) -> np.ndarray:
+        return self._records
+
+    def select(
+        self,
+        start: date = None,
+        end: date = None,
+        pairs: Iterable = None,
+        events: Iterable = None,
+    ) -> np.ndarray:
+        """Select the records with an event date within [start, end],
+        of the given pairs and event types (all by default).
+
+        Returns:
+            a copy of the selected records, in file order.
+        """
+        records = self._records
+        mask = np.ones(len(records), dtype=bool)
+        if start is not None:
+            mask &= records["date"] >= to_days(start)
+        if end is not None:
+            mask &= records["date"] <= to_days(end)
+        if pairs is not None:
+            mask &= np.isin(records["pair"], [pair.encode() for pair in pairs])
+        if events is not None:
+            mask &= np.isin(records["event"], [EVENT_TYPES.index(e) for e in events])
+        return np.array(records[mask])
+
+    def read_dataframe(self, **filters) -> pd.DataFrame:
+        """Read the selected records (see `select`) as a dataframe with
+        the trade ids as UUIDs and the events and pairs as strings."""
+        records = self.select(**filters)
+        columns = {name: records[name] for name in EVENT_DTYPE.names}
+        columns["trade_id"] = [UUID(bytes=bytes(i)) for i in records["trade_id"]]
+        columns["event"] = np.array(EVENT_TYPES)[records["event"]]
+        columns["pair"] = np.char.decode(records["pair"])
+        return pd.DataFrame(columns)
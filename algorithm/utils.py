@@ -3,25 +3,73 @@ import csv
 import numpy as np
 import pandas as pd
 import datetime
+import os
 import time
 
+# Smile quotes as (key, BBG quote code) for the delta-bucketed vol files.
+SMILE_QUOTES = (
+    ("rr_25", "25R"),
+    ("bf_25", "25B"),
+    ("rr_10", "10R"),
+    ("bf_10", "10B"),
+)
+
 
 class FileDef(object):
     """An object class to pass as args to `load_csv_data`"""
 
     filename = None
     colname = None
+    field = None
 
-    def __init__(self, filename, colname="value"):
+    def __init__(self, filename, colname="value", field=None):
+        """Args:
+        filename: the path of the csv file.
+        Kwargs:
+            colname (str, default: "value") - Name of the loaded column
+            field (str, default: None) - Name of the column of the file
+                to load (e.g. "PX_HIGH"). None to load the main column
+                of `load_csv_data`.
+        """
         self.filename = filename
         self.colname = colname
+        self.field = field
+
+
+def smile_colnames(tenor: str) -> dict:
+    """Get the column names of the ATMF vol and smile quotes of a tenor"""
+    tenor = tenor.lower()
+    colnames = {"atm": f"{tenor}_annualised_atmf_vol"}
+    colnames.update({key: f"{tenor}_{key}" for key, _ in SMILE_QUOTES})
+    return colnames
+
+
+def smile_file_defs(pair: str, tenor: str, data_dir: str) -> list:
+    """Get the FileDefs of the risk reversal and butterfly files of a tenor.
+
+    The files are expected to be named as the BBG tickers, e.g.
+    "EURUSDx25R1M.csv" for the EURUSD 1M 25D risk reversal.
+
+    Args:
+        pair: the currency pair (e.g. "EURUSD").
+        tenor: the tenor label (e.g. "1m").
+        data_dir: the directory with the market data files.
+    """
+    colnames = smile_colnames(tenor)
+    return [
+        FileDef(
+            filename=os.path.join(data_dir, f"{pair}x{code}{tenor.upper()}.csv"),
+            colname=colnames[key],
+        )
+        for key, code in SMILE_QUOTES
+    ]
 
 
 def load_csv_data(
     *file_defs,
     date_colname="\ufeffDate",
     main_colname="PX_LAST",
-    load_using_pandas=False
+    load_using_pandas=False,
 ) -> pd.DataFrame:
     """Load market data from csv files as given in BBG files.
     Args:
@@ -44,7 +92,9 @@ def load_csv_data(
         for file_def in file_defs:
             filename = file_def.filename
             colname = file_def.colname
+            field = main_colname if file_def.field is None else file_def.field
             temp_df = pd.read_csv(filename)
+            temp_df = temp_df[[temp_df.columns[0], field]]
             temp_df.columns = ["date", colname]
             temp_df[colname] = pd.to_numeric(temp_df[colname])
             temp_df["date"] = pd.to_datetime(temp_df["date"])
@@ -57,6 +107,7 @@ def load_csv_data(
         for file_def in file_defs:
             filename = file_def.filename
             colname = file_def.colname
+            field = main_colname if file_def.field is None else file_def.field
             with open(filename, encoding="utf-8") as f:
                 reader = csv.DictReader(f)
                 for row in reader:
@@ -65,7 +116,7 @@ def load_csv_data(
                         hash_output[str_date] = {
                             "date": datetime.datetime.strptime(str_date, date_format)
                         }
-                    hash_output[str_date][colname] = float(row[main_colname])
+                    hash_output[str_date][colname] = float(row[field])
         df = pd.DataFrame(hash_output.values())
     return df
 
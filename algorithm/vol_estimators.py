@@ -0,0 +1,278 @@
+import math
+import numpy as np
+
+from algorithm.stat_methods import rolling_mean
+
+PERIODS_PER_YEAR = 252
+
+
+def _as_panel(arr) -> np.ndarray:
+    """A 2-D float array of shape (n_days, n_series)"""
+    arr = np.asarray(arr, dtype=float)
+    return arr.reshape(len(arr), -1)
+
+
+def _log_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.log(numerator / denominator)
+
+
+def _lag(panel: np.ndarray, lag: int = 1) -> np.ndarray:
+    output = np.full(panel.shape, np.NaN)
+    output[lag:] = panel[:-lag]
+    return output
+
+
+class RealisedVolEstimator:
+    """Base class of the realised vol estimators.
+
+    Every estimator works on panels of shape (n_days, n_series) (or
+    1-D arrays for a single series) and returns a panel of annualised
+    vols of the same shape, in which the value at each day only uses
+    the data up to that day.
+    """
+
+    required_fields = ("close",)
+
+    def __init__(
+        self,
+        window_size: int,
+        min_periods: int = None,
+        periods_per_year: int = PERIODS_PER_YEAR,
+    ) -> None:
+        """Args:
+        window_size: the number of days in each estimation window.
+        Kwargs:
+            min_periods (int, default: window_size) - Minimum number of
+                valid observations in a window
+            periods_per_year (int, default: 252) - Annualisation factor
+        """
+        self.window_size = window_size
+        self.min_periods = window_size if min_periods is None else min_periods
+        self.periods_per_year = periods_per_year
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(window_size={self.window_size})"
+
+    def daily_variances(self, close, open=None, high=None, low=None) -> np.ndarray:
+        """Daily variance contributions, averaged over the window"""
+        raise NotImplementedError()
+
+    def estimate(self, close, open=None, high=None, low=None) -> np.ndarray:
+        """Calculate the rolling annualised vol of every series.
+
+        Args:
+            close: the closing levels.
+        Kwargs:
+            open, high, low: the opening, high and low levels, for the
+                estimators that require them (see `required_fields`).
+        """
+        fields = {"close": close, "open": open, "high": high, "low": low}
+        missing = [name for name in self.required_fields if fields[name] is None]
+        if missing:
+            raise ValueError(f"{self} requires the fields {missing}")
+        panels = {
+            name: None if values is None else _as_panel(values)
+            for name, values in fields.items()
+        }
+        variances = rolling_mean(
+            self.daily_variances(**panels),
+            self.window_size,
+            "min_periods",
+            self.min_periods,
+        )
+        return np.sqrt(self.periods_per_year * variances)
+
+
+class CloseToClose(RealisedVolEstimator):
+    """Close-to-close estimator. With zero_mean (the variance swap
+    convention) it is the root mean squared log return."""
+
+    def __init__(self, window_size: int, zero_mean: bool = True, **kwargs) -> None:
+        super().__init__(window_size, **kwargs)
+        self.zero_mean = zero_mean
+
+    def daily_variances(self, close, open=None, high=None, low=None) -> np.ndarray:
+        return _log_ratio(close, _lag(close)) ** 2
+
+    def estimate(self, close, open=None, high=None, low=None) -> np.ndarray:
+        vols = super().estimate(close)
+        if self.zero_mean:
+            return vols
+        close = _as_panel(close)
+        returns = _log_ratio(close, _lag(close))
+        means = rolling_mean(returns, self.window_size, "min_periods", self.min_periods)
+        counts = (
+            rolling_mean(
+                (~np.isnan(returns)).astype(float), self.window_size, "min_periods", 1
+            )
+            * self.window_size
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variances = (vols ** 2 / self.periods_per_year - means ** 2) * (
+                counts / (counts - 1)
+            )
+        return np.sqrt(self.periods_per_year * variances)
+
+
+class Parkinson(RealisedVolEstimator):
+    """High-low range estimator of Parkinson (1980)"""
+
+    required_fields = ("high", "low")
+
+    def daily_variances(self, close, open=None, high=None, low=None) -> np.ndarray:
+        return _log_ratio(high, low) ** 2 / (4 * math.log(2))
+
+
+class GarmanKlass(RealisedVolEstimator):
+    """Open-high-low-close estimator of Garman and Klass (1980)"""
+
+    required_fields = ("open", "high", "low", "close")
+
+    def daily_variances(self, close, open=None, high=None, low=None) -> np.ndarray:
+        return (
+            0.5 * _log_ratio(high, low) ** 2
+            - (2 * math.log(2) - 1) * _log_ratio(close, open) ** 2
+        )
+
+
+class RealisedVolForecaster(RealisedVolEstimator):
+    """Base class of the forecasters. The value at each day is the
+    forecast of the annualised vol over the next window_size days.
+
+    The model parameters are fitted on the first fit_size days of
+    each series (all the days by default, i.e. in-sample).
+    """
+
+    def __init__(self, window_size: int, fit_size: int = None, **kwargs) -> None:
+        super().__init__(window_size, **kwargs)
+        self.fit_size = fit_size
+
+
+class HAR(RealisedVolForecaster):
+    """Heterogeneous autoregressive model of realised variance (Corsi, 2009).
+
+    The variance over the next window is regressed on the daily, weekly
+    and monthly averages of the squared daily log returns, for all the
+    series at once by batched least squares.
+    """
+
+    lags = (1, 5, 22)
+
+    def _features(self, squared_returns: np.ndarray) -> np.ndarray:
+        """Panel of regressors of shape (n_days, n_series, 1 + len(lags))"""
+        features = [np.ones(squared_returns.shape)]
+        features += [
+            rolling_mean(squared_returns, lag, "min_periods") for lag in self.lags
+        ]
+        return np.stack(features, axis=-1)
+
+    def estimate(self, close, open=None, high=None, low=None) -> np.ndarray:
+        close = _as_panel(close)
+        squared_returns = _log_ratio(close, _lag(close)) ** 2
+        X = self._features(squared_returns)
+        # Target at t: the mean squared return over t+1..t+window_size
+        y = np.full(squared_returns.shape, np.NaN)
+        means = rolling_mean(
+            squared_returns, self.window_size, "min_periods", self.min_periods
+        )
+        y[: -self.window_size] = means[self.window_size :]
+
+        # Only the targets fully observed within the first fit_size days
+        fit_size = len(close) if self.fit_size is None else self.fit_size
+        n_fit = max(fit_size - self.window_size, 0)
+        X_fit, y_fit = X[:n_fit], y[:n_fit]
+        valid = ~(np.isnan(X_fit).any(axis=-1) | np.isnan(y_fit))
+        X_fit = np.where(valid[..., np.newaxis], X_fit, 0)
+        y_fit = np.where(valid, y_fit, 0)
+        XtX = np.einsum("tsi,tsj->sij", X_fit, X_fit)
+        Xty = np.einsum("tsi,ts->si", X_fit, y_fit)
+        β = np.einsum("sij,sj->si", np.linalg.pinv(XtX), Xty)
+
+        forecasts = np.einsum("tsi,si->ts", X, β)
+        return np.sqrt(self.periods_per_year * np.maximum(forecasts, 0))
+
+
+class GARCH11(RealisedVolForecaster):
+    """GARCH(1,1) model of the daily log returns.
+
+    The long-run variance is targeted to the sample variance and (α, β)
+    maximise the Gaussian likelihood over a grid, evaluated for every
+    grid point and series at once. Missing returns carry no information:
+    the variance is rolled forward with its expectation.
+    """
+
+    def __init__(
+        self,
+        window_size: int,
+        alphas: np.ndarray = np.linspace(0.01, 0.3, 30),
+        persistences: np.ndarray = np.linspace(0.8, 0.999, 40),
+        **kwargs,
+    ) -> None:
+        """Args:
+        window_size: the number of days of the forecast.
+        Kwargs:
+            alphas - Grid of values of α
+            persistences - Grid of values of α + β
+            fit_size, periods_per_year - see `RealisedVolForecaster`
+        """
+        super().__init__(window_size, **kwargs)
+        α, persistence = np.meshgrid(alphas, persistences)
+        valid = α < persistence
+        self._alphas = α[valid]
+        self._betas = (persistence - α)[valid]
+
+    @staticmethod
+    def _filter(
+        returns: np.ndarray, α, β, long_run_variance, store_variances: bool = True
+    ) -> tuple:
+        """Conditional variances (for each day, before its return is known)
+        and log-likelihoods. The parameters broadcast with returns[0].
+        Without store_variances the variances are not kept (None), e.g.
+        to fit over a large grid of parameters in constant memory."""
+        ω = long_run_variance * (1 - α - β)
+        shape = np.broadcast(returns, α).shape
+        variances = np.empty(shape) if store_variances else None
+        log_likelihoods = np.zeros(shape[1:])
+        variance = np.broadcast_to(long_run_variance, shape[1:])
+        for t, r in enumerate(returns):
+            if store_variances:
+                variances[t] = variance
+            missing = np.isnan(r)
+            squared_return = np.where(missing, variance, np.square(r))
+            log_likelihoods -= (
+                np.where(missing, 0, np.log(variance) + squared_return / variance) / 2
+            )
+            variance = ω + α * squared_return + β * variance
+        return variances, log_likelihoods
+
+    def estimate(self, close, open=None, high=None, low=None) -> np.ndarray:
+        close = _as_panel(close)
+        returns = _log_ratio(close, _lag(close))
+        fit_size = len(close) if self.fit_size is None else self.fit_size
+        long_run_variances = np.nanmean(np.square(returns[:fit_size]), axis=0)
+
+        # Fit with an axis for the grid: (n_days, n_grid, n_series)
+        α, β = self._alphas[:, np.newaxis], self._betas[:, np.newaxis]
+        _, log_likelihoods = self._filter(
+            returns[:fit_size, np.newaxis, :],
+            α,
+            β,
+            long_run_variances,
+            store_variances=False,
+        )
+        best = np.argmax(log_likelihoods, axis=0)
+        α, β = self._alphas[best], self._betas[best]
+
+        # Forecast from t: the mean of the expected variances over t+1..t+h,
+        # which revert to the long-run variance at rate α + β.
+        variances, _ = self._filter(returns, α, β, long_run_variances)
+        next_variances = np.full(variances.shape, np.NaN)
+        next_variances[:-1] = variances[1:]
+        persistence = α + β
+        h = self.window_size
+        reversion = (1 - persistence ** h) / ((1 - persistence) * h)
+        forecasts = long_run_variances + reversion * (
+            next_variances - long_run_variances
+        )
+        return np.sqrt(self.periods_per_year * forecasts)
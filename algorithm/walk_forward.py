@@ -0,0 +1,228 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from algorithm.stat_methods import gridise_arrays
+
+
+class HitRateAggregate:
+    """Counts of trades and profitable trades per cell of a grid.
+
+    Aggregates are mergeable: adding or subtracting the aggregates of
+    two windows gives the aggregate of their union or difference.
+    """
+
+    def __init__(self, counts: np.ndarray, positive_counts: np.ndarray) -> None:
+        self._counts = np.asarray(counts)
+        self._positive_counts = np.asarray(positive_counts)
+
+    def __add__(self, other: "HitRateAggregate") -> "HitRateAggregate":
+        return HitRateAggregate(
+            self.counts + other.counts, self.positive_counts + other.positive_counts
+        )
+
+    def __sub__(self, other: "HitRateAggregate") -> "HitRateAggregate":
+        return HitRateAggregate(
+            self.counts - other.counts, self.positive_counts - other.positive_counts
+        )
+
+    @property
+    def counts(self):
+        return self._counts
+
+    @property
+    def positive_counts(self):
+        return self._positive_counts
+
+    @property
+    def hit_rates(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._positive_counts / self._counts
+
+
+class CumulativeHitRates:
+    """Running hit rate aggregates of a series of trades, such that
+    the aggregate of any window of trades is obtained in O(n_cells)."""
+
+    def __init__(self, cells: np.ndarray, payoffs: np.ndarray, n_cells: int) -> None:
+        """Args:
+        cells: the grid cell of each trade, ordered by trade date.
+        payoffs: the payoff of each trade. NaN for unsettled trades,
+            which are not counted.
+        n_cells: the number of cells of the grid.
+        """
+        n = len(cells)
+        settled = ~np.isnan(payoffs)
+        self._counts = np.zeros([n + 1, n_cells], dtype=np.int32)
+        self._positive_counts = np.zeros([n + 1, n_cells], dtype=np.int32)
+        self._counts[np.arange(1, n + 1), cells] = settled
+        self._positive_counts[np.arange(1, n + 1), cells] = settled & (payoffs > 0)
+        np.cumsum(self._counts, axis=0, out=self._counts)
+        np.cumsum(self._positive_counts, axis=0, out=self._positive_counts)
+
+    def __getitem__(self, index: int) -> HitRateAggregate:
+        """The aggregate of the trades before index"""
+        return HitRateAggregate(self._counts[index], self._positive_counts[index])
+
+    def window(self, start: int, end: int) -> HitRateAggregate:
+        """The aggregate of the trades in [start, end)"""
+        return self[end] - self[start]
+
+
+def decide_directions(
+    hit_rates: np.ndarray,
+    counts: np.ndarray,
+    buy_threshold: float = 0.5,
+    sell_threshold: float = 0.5,
+    min_count: int = 1,
+) -> np.ndarray:
+    """Trading decision from the hit rates of buying in each cell:
+    1 (buy) above buy_threshold, -1 (sell) below sell_threshold and
+    0 otherwise, or when the cell has fewer than min_count trades."""
+    directions = np.zeros(len(hit_rates), dtype=np.int8)
+    enough = counts >= min_count
+    directions[enough & (hit_rates > buy_threshold)] = 1
+    directions[enough & (hit_rates < sell_threshold)] = -1
+    return directions
+
+
+def _evaluate_fold(
+    train: HitRateAggregate,
+    test_cells: np.ndarray,
+    test_payoffs: np.ndarray,
+    buy_threshold: float,
+    sell_threshold: float,
+    min_count: int,
+) -> dict:
+    directions = decide_directions(
+        train.hit_rates[test_cells],
+        train.counts[test_cells],
+        buy_threshold,
+        sell_threshold,
+        min_count,
+    )
+    traded = (directions != 0) & ~np.isnan(test_payoffs)
+    pnls = directions[traded] * test_payoffs[traded]
+    return {
+        "n_buys": int(np.sum(directions[traded] == 1)),
+        "n_sells": int(np.sum(directions[traded] == -1)),
+        "pnl": float(pnls.sum()),
+        "hit_rate": float(np.mean(pnls > 0)) if len(pnls) else np.NaN,
+    }
+
+
+def walk_forward(
+    dates: np.ndarray,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    payoffs: np.ndarray,
+    shape: tuple,
+    train_size: int,
+    test_size: int,
+    step: int = None,
+    embargo: int = 0,
+    value_dates: np.ndarray = None,
+    expanding: bool = False,
+    buy_threshold: float = 0.5,
+    sell_threshold: float = 0.5,
+    min_count: int = 1,
+    n_jobs: int = 1,
+) -> pd.DataFrame:
+    """Walk-forward evaluation of the hit rate grid.
+
+    For each fold, the hit rates of buying in each cell of the grid are
+    fitted on a training window, and the trades of the following test
+    window are bought or sold according to the hit rate of their cell
+    (see `decide_directions`). The signals are computed once for the
+    whole history and the training aggregates of every fold are taken
+    from running sums, so no fold is recomputed from scratch.
+
+    Args:
+        dates: the trade dates, in ascending order.
+        xs: the signal on the x-axis of the grid (e.g. vol percentile).
+        ys: the signal on the y-axis of the grid (e.g. vol carry).
+        payoffs: the payoff of buying each trade as given by
+            `VarianceSwap.payoff`. NaN for trades with no payoff.
+        shape: the grid shape as passed to `gridiserFactory`. Signals
+            outside the bounds fall in the edge cells.
+        train_size: the number of trades in each training window.
+        test_size: the number of trades in each test window.
+    Kwargs:
+        step (int, default: test_size) - Number of trades the origin is
+            rolled forward between folds
+        embargo (int, default: 0) - Number of trades skipped between the
+            training and test windows
+        value_dates (default: None) - The value date of each trade. If
+            provided, each training window ends before the first trade
+            that does not settle before the test window starts, so that
+            no training payoff is unknown when the test trades are decided.
+            Folds with fewer than train_size such trades are skipped
+            (unless expanding).
+        expanding (bool, default: False) - True to train on all the
+            history before each test window
+        buy_threshold, sell_threshold, min_count - see `decide_directions`
+        n_jobs (int, default: 1) - Number of processes
+    Returns:
+        a dataframe with a row per fold, with the fold dates, number of
+        bought and sold trades, P&L and hit rate of the traded trades.
+    """
+    step = test_size if step is None else step
+    xs = np.clip(xs, shape[0]["min"], shape[0]["max"])
+    ys = np.clip(ys, shape[1]["min"], shape[1]["max"])
+    xcells, ycells = gridise_arrays(shape, xs, ys)
+    ydivs = shape[1]["divisions"]
+    cells = xcells * ydivs + ycells
+    payoffs = np.asarray(payoffs, dtype=float)
+    cumulative = CumulativeHitRates(cells, payoffs, shape[0]["divisions"] * ydivs)
+
+    if value_dates is not None:
+        # Running latest value date: searching a date in it gives the
+        # number of leading trades that settle before that date
+        settled_until = np.maximum.accumulate(np.asarray(value_dates))
+
+    folds = []
+    test_start = train_size + embargo
+    while test_start < len(dates):
+        test_end = min(test_start + test_size, len(dates))
+        train_end = test_start - embargo
+        if value_dates is not None:
+            train_end = min(
+                train_end,
+                np.searchsorted(settled_until, dates[test_start], side="left"),
+            )
+        train_start = 0 if expanding else train_end - train_size
+        if train_start >= 0 and train_end > train_start:
+            folds.append((train_start, train_end, test_start, test_end))
+        test_start += step
+
+    args = [
+        (
+            cumulative.window(train_start, train_end),
+            cells[test_start:test_end],
+            payoffs[test_start:test_end],
+            buy_threshold,
+            sell_threshold,
+            min_count,
+        )
+        for train_start, train_end, test_start, test_end in folds
+    ]
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_evaluate_fold, *zip(*args)))
+    else:
+        results = [_evaluate_fold(*arg) for arg in args]
+
+    return pd.DataFrame(
+        [
+            {
+                "train_start": dates[train_start],
+                "train_end": dates[train_end - 1],
+                "test_start": dates[test_start],
+                "test_end": dates[test_end - 1],
+                **result,
+            }
+            for (train_start, train_end, test_start, test_end), result in zip(
+                folds, results
+            )
+        ]
+    )
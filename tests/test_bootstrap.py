@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from algorithm.bootstrap import (
+    block_bootstrap_indexes,
+    bootstrap_hit_rates,
+    bootstrap_grid_hit_rates,
+)
+
+
+def test_block_bootstrap_indexes():
+    indexes = block_bootstrap_indexes(10, 4, 3, np.random.RandomState(0))
+    assert indexes.shape == (4, 10)
+    assert indexes.min() >= 0 and indexes.max() < 10
+    # Blocks are made of consecutive observations
+    assert (np.diff(indexes[:, :3], axis=1) == 1).all()
+
+
+def test_bootstrap_hit_rates():
+    random_state = np.random.RandomState(1)
+    cells = np.repeat([0, 2], [300, 5])
+    positives = random_state.rand(len(cells)) < 0.6
+    kwargs = {"n_resamples": 1_000, "block_size": 21, "seed": 7, "chunk_size": 300}
+    results = bootstrap_hit_rates(cells, positives, **kwargs)
+    assert list(results.total_count) == [300, 0, 5]
+    assert np.isnan(results.loc[1, ["hit_rate", "lower", "upper"]]).all()
+    assert (results.lower[[0, 2]] <= results.hit_rate[[0, 2]]).all()
+    assert (results.hit_rate[[0, 2]] <= results.upper[[0, 2]]).all()
+    widths = results.upper - results.lower
+    assert widths[2] > widths[0]  # Fewer trades, less significant
+
+    # Reproducible, regardless of the number of processes
+    parallel_results = bootstrap_hit_rates(cells, positives, n_jobs=2, **kwargs)
+    pd.testing.assert_frame_equal(results, parallel_results)
+
+
+def test_bootstrap_grid_hit_rates():
+    df = pd.DataFrame(
+        {"x": [0, 0.1, 0.9, 1], "y": [0, 1, 0, 1], "p": [True, False, True, True]}
+    )
+    results = bootstrap_grid_hit_rates(df, 2, 2, "x", "y", "p", n_resamples=10, seed=0)
+    assert list(results.coordinates) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert list(results.hit_rate) == [1, 0, 1, 1]
@@ -0,0 +1,65 @@
+from multiprocessing import get_context
+import os
+import unittest
+import numpy as np
+
+from algorithm.market_store import MarketDataWriter, MarketDataReader, _header
+from algorithm.utils import load_csv_data
+from . import FILE_DEFS
+
+
+def _read_in_child(store_name, pair, queue):
+    with MarketDataReader(store_name) as reader:
+        data = reader.read(pair)
+        queue.put((len(data["date"]), float(np.nansum(data["spot"]))))
+        del data
+
+
+def test_market_data_store():
+    store_name = f"fxvol_test_{os.getpid()}"
+    df = load_csv_data(*FILE_DEFS).sort_values(by="date")
+    with MarketDataWriter(store_name) as writer:
+        writer.publish_dataframe("EURUSD", df.iloc[:-10], capacity=len(df))
+        reader = MarketDataReader(store_name)
+        assert reader.pairs() == ["EURUSD"]
+
+        data = reader.read("EURUSD")
+        assert len(data["date"]) == len(df) - 10
+        assert not data["spot"].flags.writeable
+        expected_dates = np.array(df["date"].iloc[:-10], dtype="datetime64[D]")
+        assert (data["date"] == expected_dates).all()
+        version = data["version"]
+
+        # Appends from the writer are seen by the attached readers
+        tail = df.iloc[-10:]
+        writer.append(
+            "EURUSD",
+            np.array(tail["date"]),
+            spot=np.array(tail["spot"]),
+            **{"1y_atmf_vol": np.array(tail["1y_atmf_vol"])},
+        )
+        assert reader.version("EURUSD") > version
+        read_df = reader.read_dataframe("EURUSD")
+        assert read_df.count()["spot"] == 3130
+        assert (read_df["date"].values == df["date"].values).all()
+        with unittest.TestCase.assertRaises(None, ValueError):
+            writer.append("EURUSD", tail["date"], spot=tail["spot"])
+
+        # Other processes attach to the same memory
+        queue = get_context("spawn").Queue()
+        process = get_context("spawn").Process(
+            target=_read_in_child, args=(store_name, "EURUSD", queue)
+        )
+        process.start()
+        assert queue.get(timeout=60) == (len(df), float(np.nansum(df["spot"])))
+        process.join()
+
+        # Reads time out when the writer dies while writing
+        header = _header(reader._segment("EURUSD")[0])
+        header[0] += 1
+        with MarketDataReader(store_name, timeout=0.01) as stuck_reader:
+            with unittest.TestCase.assertRaises(None, TimeoutError):
+                stuck_reader.read("EURUSD")
+        header[0] -= 1
+        del data, read_df, header
+        reader.close()
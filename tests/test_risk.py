@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+import numpy as np
+
+from algorithm.risk import Scenarios, VarianceSwapBook
+from algorithm.term_structure import VolTermStructure
+from algorithm.trade_classes import VarianceSwap
+
+valuation_date = date(2020, 3, 2)
+
+
+def build_book():
+    trades = [
+        VarianceSwap(
+            direction=direction,
+            underlying="EURUSD",
+            trade_date=trade_date,
+            value_date=trade_date + timedelta(days=days),
+            strike=strike,
+            vega_amount=1,
+        )
+        for direction, trade_date, days, strike in [
+            ("buy", date(2020, 2, 14), 30, 0.08),
+            ("sell", date(2020, 2, 14), 30, 0.09),
+            ("buy", date(2020, 1, 2), 365, 0.07),
+            ("buy", date(2020, 1, 2), 30, 0.07),  # Expired
+            ("sell", date(2020, 3, 10), 30, 0.07),  # Not traded yet
+        ]
+    ]
+    return trades, VarianceSwapBook(trades)
+
+
+def test_variance_swap_greeks():
+    trade, _ = build_book()
+    trade = trade[2]
+    params = {"realised_vol": 0.06, "fair_strike": 0.075, "r": 0.01}
+    greeks = trade.calc_greeks(**params, valuation_date=valuation_date)
+
+    def mtm(**kwargs):
+        return trade.calc_mtm(**{**params, **kwargs}, valuation_date=valuation_date)
+
+    ε = 1e-6
+    vega = (mtm(fair_strike=0.075 + ε) - mtm(fair_strike=0.075 - ε)) / (2 * ε)
+    assert np.isclose(greeks["vega"], vega)
+    assert np.isclose(greeks["variance_vega"], vega / (2 * 0.075))
+    rho = (mtm(r=0.01 + ε) - mtm(r=0.01 - ε)) / (2 * ε)
+    assert np.isclose(greeks["rho"], rho)
+    next_day_mtm = trade.calc_mtm(
+        **params, valuation_date=valuation_date + timedelta(days=1)
+    )
+    assert np.isclose(greeks["theta"], next_day_mtm - mtm(), rtol=1e-3)
+
+
+def test_variance_swap_book():
+    trades, book = build_book()
+    assert list(book.live(valuation_date)) == [True, True, True, False, False]
+    realised_vols = np.full(len(book), 0.06)
+    fair_strikes = np.full(len(book), 0.075)
+    mtms = book.calc_mtm(realised_vols, fair_strikes, 0.01, valuation_date)
+    for i, trade in enumerate(trades[:3]):
+        sign = 1 if trade.direction == "buy" else -1
+        expected = trade.calc_mtm(0.06, 0.075, 0.01, valuation_date)
+        assert np.isclose(mtms[i], sign * expected)
+    assert (mtms[3:] == 0).all()
+    greeks = book.calc_greeks(realised_vols, fair_strikes, 0.01, valuation_date)
+    assert greeks["vega"][1] < 0 < greeks["vega"][0]
+
+
+def test_mtm_history():
+    trades, book = build_book()
+    dates = np.arange(
+        np.datetime64("2020-01-01"), np.datetime64("2020-04-01"), dtype="datetime64[D]"
+    )
+    term_structure = VolTermStructure(dates, [1 / 12, 1], [[0.07, 0.08]] * len(dates))
+    levels = 1.1 * np.exp(0.004 * np.cumsum(np.cos(np.arange(len(dates)))))
+    levels[40] = np.NaN
+    rows, realised_vols, mtms = book.calc_mtm_history(term_structure, levels, 0.01)
+    assert rows.shape == realised_vols.shape == mtms.shape
+
+    # Every live (trade, date) pair is valued as the single trade would be
+    for i, trade in enumerate(trades):
+        sign = 1 if trade.direction == "buy" else -1
+        live = ~np.isnan(mtms[i])
+        assert (dates[rows[i, live]] > np.datetime64(trade.trade_date)).all()
+        assert (dates[rows[i, live]] < np.datetime64(trade.value_date)).all()
+        for row, realised_vol, mtm in zip(
+            rows[i, live], realised_vols[i, live], mtms[i, live]
+        ):
+            valuation_date = dates[row].astype(date)
+            in_trade = (dates > np.datetime64(trade.trade_date)) & (dates <= dates[row])
+            expected_vol = VarianceSwap.calc_final_realised_vol(levels[in_trade])
+            fair_strike = VarianceSwap.estimate_fair_strike(
+                term_structure, (trade.value_date - valuation_date).days / 365, 0
+            )[row]
+            expected = trade.calc_mtm(expected_vol, fair_strike, 0.01, valuation_date)
+            assert np.isclose(realised_vol, expected_vol)
+            assert np.isclose(mtm, sign * expected)
+    # The 1M swap traded on 2 Jan is live from 3 to 31 Jan
+    assert (~np.isnan(mtms[3])).sum() == 29
+
+
+def test_scenario_repricing():
+    trades, book = build_book()
+    dates = [valuation_date - timedelta(days=2 - i) for i in range(3)]
+    term_structure = VolTermStructure(
+        dates, [1 / 12, 1], [[0.07, 0.08], [0.072, 0.079], [0.075, 0.08]]
+    )
+    scenarios = (
+        Scenarios.parallel_shifts([0, 0.01, -0.01], 2)
+        + Scenarios.twists([0.01], term_structure.tenors, pivot=1 / 12)
+        + Scenarios.spot_moves([0.02], 2)
+        + Scenarios.historical(term_structure, [1.1, 1.12, 1.11])
+        + Scenarios(np.zeros([1, 2]), rate_shocks=[0.01])
+    )
+    assert len(scenarios) == 8
+    assert np.allclose(scenarios.vol_shocks[-3], [0.002, -0.001])
+
+    realised_vols = np.full(len(book), 0.06)
+    values = book.reprice(
+        scenarios, term_structure, realised_vols, 0.01, valuation_date
+    )
+    by_trade = book.reprice(
+        scenarios, term_structure, realised_vols, 0.01, valuation_date, by_trade=True
+    )
+    assert by_trade.shape == (8, 5)
+    assert np.allclose(values, by_trade.sum(axis=1))
+
+    fair_strikes = book.calc_fair_strikes(term_structure, valuation_date)
+    base_value = book.calc_mtm(realised_vols, fair_strikes, 0.01, valuation_date)
+    assert np.isclose(values[0], base_value.sum())
+    assert values[1] > values[0] > values[2]  # The book is long vega
+    assert values[5] > values[0]  # Long realised variance
+
+    # A trade opened the day before has no realised variance yet (t = 0)
+    new_book = VarianceSwapBook(
+        [
+            VarianceSwap(
+                "buy",
+                "EURUSD",
+                valuation_date - timedelta(days=1),
+                valuation_date + timedelta(days=29),
+                strike=0.08,
+                vega_amount=1,
+            )
+        ]
+    )
+    args = (scenarios, term_structure, np.zeros(1), 0.01, valuation_date)
+    by_trade = new_book.reprice(*args, by_trade=True)
+    assert np.isfinite(by_trade).all()
+    assert np.allclose(new_book.reprice(*args), by_trade[:, 0])
@@ -0,0 +1,68 @@
+import math
+import numpy as np
+import pandas as pd
+
+from algorithm.skew import (
+    reconstruct_smile,
+    calc_log_moneyness,
+    estimate_skew_slopes,
+    smile_from_dataframe,
+    interpolate_skew_slopes,
+)
+
+
+def test_reconstruct_smile():
+    smile = reconstruct_smile(
+        atm=np.array([0.1, 0.2]),
+        rr_25=np.array([-0.02, 0.01]),
+        bf_25=np.array([0.005, 0.005]),
+    )
+    assert smile.shape == (2, 5)
+    assert np.allclose(smile[0, 1:4], [0.115, 0.1, 0.095])
+    assert np.isnan(smile[:, [0, 4]]).all()
+
+
+def test_estimate_skew_slopes():
+    T = 1 / 12
+    vols = np.array([0.1, 0.12])
+    flat_smile = np.repeat(vols[:, np.newaxis], 5, axis=1)
+    assert np.allclose(estimate_skew_slopes(flat_smile, T), 0)
+
+    # A smile built on a line recovers the slope of the line
+    log_moneyness = calc_log_moneyness(flat_smile, T)
+    assert np.allclose(log_moneyness[:, 2], 0)
+    assert (np.diff(log_moneyness, axis=1) > 0).all()
+    for slope, linear_skew in [(0.2, True), (-2 / 100 / math.log(0.9), False)]:
+        smile = flat_smile
+        for _ in range(20):  # The moneyness of each pillar depends on its vol
+            x = calc_log_moneyness(smile, T)
+            x = np.exp(x) - 1 if linear_skew else x
+            smile = vols[:, np.newaxis] - slope * x
+        smile[0, 0] = np.nan  # Missing pillars are ignored
+        assert np.allclose(
+            estimate_skew_slopes(smile, T, linear_skew=linear_skew), slope
+        )
+
+
+def test_smile_from_dataframe():
+    df = pd.DataFrame(
+        {
+            "1m_annualised_atmf_vol": [10.0, 11.0],
+            "1m_rr_25": [-1.0, -1.0],
+            "1m_bf_25": [0.2, 0.2],
+            "1y_annualised_atmf_vol": [9.0, 9.0],
+            "1y_rr_25": [-2.0, -2.0],
+            "1y_bf_25": [0.2, 0.2],
+        }
+    )
+    smiles = smile_from_dataframe(df, ["1m", "1y"], scale=1 / 100)
+    assert smiles.shape == (2, 2, 5)
+    slopes = estimate_skew_slopes(smiles, T=np.array([1 / 12, 1]))
+    assert (slopes > 0).all()
+    assert (slopes[:, 1] < slopes[:, 0]).all()  # Flatter in moneyness for 1Y
+
+
+def test_interpolate_skew_slopes():
+    slopes = np.array([[0.1, 0.3], [0.2, 0.2]])
+    results = interpolate_skew_slopes([0.5, 1], slopes, np.array([[0.75, 2], [0.1, 1]]))
+    assert np.allclose(results, [[0.2, 0.3], [0.2, 0.2]])
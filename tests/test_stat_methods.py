@@ -1,12 +1,21 @@
 from algorithm.stat_methods import (
     calc_annual_realised_vol,
+    calc_annual_realised_vols,
     sum_squares_moving_window,
     calc_moving_annual_realised_vol,
     calc_moving_percentile,
     forecast_ema_vol,
     gridiserFactory,
+    first_valid_index,
+    forward_fill,
+    rolling_apply,
+    rolling_sum,
+    rolling_mean,
+    calc_log_returns,
+    gridise_arrays,
 )
 
+import math
 import unittest
 import numpy as np
 
@@ -20,6 +29,17 @@ def test_calc_annual_realised_vol():
     assert round(result, 3) == expected_result
 
 
+def test_calc_annual_realised_vols():
+    levels = np.array([1, 1.1, np.nan, 1.05, 1.2, 1.15, np.nan])
+    starts = np.array([0, 1, 2, 6, 5])
+    ends = np.array([6, 4, 3, 6, 4])
+    results = calc_annual_realised_vols(levels, starts, ends)
+    for result, start, end in zip(results[:3], starts, ends):
+        expected = calc_annual_realised_vol(levels[start : end + 1])
+        assert np.isclose(result, expected)
+    assert np.isnan(results[3:]).all()
+
+
 def test_sum_squares_moving_window():
     arr = np.array(range(1, 10))
     results = sum_squares_moving_window(arr, 4)
@@ -46,6 +66,19 @@ def test_ema_forecast():
     vol_0 = 0.210
     results = forecast_ema_vol(test_data.dummy_levels, vol_0=vol_0, _lambda=0.9)
     assert all(np.round(results, 3) == test_data.expected_ema_forecast)
+    # Each return updates the forecast at the level it ends at, so the
+    # first window_size - 1 levels have no forecast
+    levels = np.array(test_data.dummy_levels, dtype=float)
+    results = forecast_ema_vol(levels, vol_0=vol_0, window_size=3, _lambda=0.9)
+    assert np.isnan(results[:2]).all() and results[2] == vol_0
+    assert not np.isnan(results[2:]).any()
+    r = math.log(levels[3] / levels[0])
+    assert math.isclose(results[3], (0.9 * vol_0 ** 2 + 0.1 * r ** 2) ** 0.5)
+    # Later levels cannot change the forecasts
+    shocked = levels.copy()
+    shocked[-1] *= 2
+    shocked_results = forecast_ema_vol(shocked, vol_0, window_size=3, _lambda=0.9)
+    assert np.array_equal(results[:-1], shocked_results[:-1], equal_nan=True)
 
 
 def test_gridiserFactory():
@@ -61,3 +94,83 @@ def test_gridiserFactory():
         gridise(-10, 0)
     with unittest.TestCase.assertRaises(None, ValueError):
         gridise(0, 10)
+
+    xs, ys = np.array([-8.7, 0, -3, 3, -5]), np.array([0.1, 0, 4, 6, 2])
+    xcells, ycells = gridise_arrays(shape, xs, ys)
+    assert list(zip(xcells, ycells)) == [gridise(x, y) for x, y in zip(xs, ys)]
+    with unittest.TestCase.assertRaises(None, ValueError):
+        gridise_arrays(shape, xs, ys + 10)
+
+
+def test_nan_helpers():
+    arr = np.array([np.nan, np.nan, 1, np.nan, 3])
+    assert first_valid_index(arr) == 2
+    assert first_valid_index(np.array([np.nan])) is None
+    filled = forward_fill(arr)
+    assert np.isnan(filled[:2]).all()
+    assert all(filled[2:] == [1, 1, 3])
+    with np.errstate(divide="raise"):  # No division by padded zeros
+        returns = calc_log_returns(np.array([1, np.nan, 2, 2]))
+    assert all(np.isnan(returns[:2])) and returns[2] == 0
+
+
+def test_rolling_kernel_nan_policies():
+    arr = np.array([1, 2, np.nan, 4, 5])
+    results = rolling_sum(arr, 2, nan_policy="skip")
+    assert np.isnan(results[[0, 2]]).all()
+    assert all(results[[1, 3, 4]] == [3, 6, 9])
+    results = rolling_sum(arr, 2, nan_policy="ffill")
+    assert all(results[1:] == [3, 4, 6, 9])
+    results = rolling_sum(arr, 2, nan_policy="min_periods", min_periods=1)
+    assert np.isnan(results[0])
+    assert all(results[1:] == [3, 2, 4, 9])
+
+    def window_sums(windows, mask):
+        return np.where(mask, windows, 0).sum(axis=1)
+
+    for nan_policy in ("skip", "ffill", "min_periods"):
+        expected = rolling_sum(arr, 3, nan_policy=nan_policy, min_periods=2)
+        results = rolling_apply(arr, 3, window_sums, nan_policy, min_periods=2)
+        assert np.allclose(results, expected, equal_nan=True)
+    with unittest.TestCase.assertRaises(None, ValueError):
+        rolling_sum(arr, 2, nan_policy="dropna")
+
+
+def test_rolling_panels():
+    panel = np.array([[1, 2], [3, np.nan], [5, 6], [7, 8]])
+    means = rolling_mean(panel, 2, "min_periods")
+    assert np.isnan(means[0]).all()
+    assert list(means[1:, 0]) == [2, 4, 6]
+    assert np.isnan(means[1, 1]) and np.isnan(means[2, 1])
+    assert means[3, 1] == 7
+    assert rolling_mean(panel, 2, "min_periods", min_periods=1)[2, 1] == 6
+
+    # Every series is rolled as a 1-D array, along any axis
+    for nan_policy in ("ffill", "min_periods"):
+        sums = rolling_sum(panel.T, 2, nan_policy, min_periods=1, axis=1)
+        for i in range(2):
+            expected = rolling_sum(panel[:, i], 2, nan_policy, min_periods=1)
+            assert np.allclose(sums[i], expected, equal_nan=True)
+    with unittest.TestCase.assertRaises(None, ValueError):
+        rolling_sum(panel, 2, "skip")
+
+
+def test_moving_stats_with_gaps():
+    levels = test_data.dummy_levels.copy()
+    levels_with_gap = np.insert(levels, 4, np.nan)
+    results = calc_moving_annual_realised_vol(levels_with_gap, 3)
+    expected = calc_moving_annual_realised_vol(levels, 3)
+    assert np.isnan(results[3])
+    assert np.allclose(np.delete(results, 3), expected, equal_nan=True)
+
+    ema = forecast_ema_vol(levels_with_gap, vol_0=0.210, _lambda=0.9)
+    assert np.isnan(ema[4])
+    assert all(np.round(np.delete(ema, 4), 3) == test_data.expected_ema_forecast)
+
+    vols = np.insert(test_data.dummy_implied_vols, 4, np.nan)
+    results = calc_moving_percentile(vols, 3)
+    assert np.allclose(
+        np.delete(results, 4),
+        test_data.expected_implied_vol_percentiles,
+        equal_nan=True,
+    )
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from algorithm.strategy import RuleSet, simulate, simulate_summary
+
+
+def test_rule_set_positions():
+    rules = RuleSet.grid(sell_percentile=[0.5, 0.8], sell_carry=[0, 0.01])
+    assert len(rules) == 4
+    assert list(rules.to_frame().sell_carry) == [0, 0.01, 0, 0.01]
+
+    rules = RuleSet(
+        sell_percentile=0.8,
+        sell_carry=0,
+        buy_percentile=0.2,
+        buy_carry=[0, -1],
+        vega_amount=[1, 2],
+    )
+    percentiles = np.array([0.9, 0.9, 0.1, 0.5, np.nan])
+    carries = np.array([0.01, -0.01, -0.01, 0, 0.01])
+    positions = rules.positions(percentiles, carries)
+    assert positions.shape == (2, 5)
+    assert list(positions[0]) == [-1, 0, 1, 0, 0]
+    assert list(positions[1]) == [-2, 0, 0, 0, 0]
+    sizes = np.array([2, 1, 1, 1, np.nan])
+    assert list(rules.positions(percentiles, carries, sizes)[0]) == [-2, 0, 1, 0, 0]
+    assert list(rules[1:].to_frame().vega_amount) == [2]
+
+
+def test_simulate():
+    rules = RuleSet(sell_percentile=[0.5, 2], sell_carry=0)
+    # Two pairs, with a signal to sell on every day of the first pair
+    percentiles = np.array([[0.9] * 6, [0.9, 0, 0, 0.9, 0, 0]])
+    carries = np.ones([2, 6])
+    payoffs = np.array([[-1, -1, -1, -1, np.nan, np.nan], [2, 0, 0, -3, 0, np.nan]])
+    settlement_indexes = np.tile(np.arange(6) + 2, (2, 1))
+    result = simulate(rules, percentiles, carries, payoffs, settlement_indexes)
+
+    assert result.positions.shape == (2, 2, 6)
+    assert list(result.exposure[0, 0]) == [-1, -2, -2, -2, -2, -2]
+    assert list(result.open_trades[0, 1]) == [1, 1, 0, 1, 1, 0]
+    # P&L is realised at maturity and aggregated across pairs
+    assert list(result.portfolio_pnl[0]) == [0, 0, 1 - 2, 1, 1, 1 + 3]
+    assert list(result.drawdown[0]) == [0, 0, 1, 0, 0, 0]
+    summary = result.summary()
+    assert list(summary.pnl) == [5, 0]
+    assert list(summary.n_trades) == [8, 0]
+    assert list(summary.max_drawdown) == [1, 0]
+
+
+def test_simulate_settlements_sizes_and_marks():
+    rules = RuleSet(sell_percentile=[0.5, 2], sell_carry=0)
+    percentiles = np.full(6, 0.9)
+    carries = np.ones(6)
+    payoffs = np.array([-1, -1, -2, -1, np.nan, np.nan])
+    # Trades of 2 or 3 days, two of which settle on the same day
+    settlement_indexes = np.array([2, 4, 4, 5, 6, 6])
+    sizes = np.array([1, 1, 2, 1, 1, 1])
+    result = simulate(rules, percentiles, carries, payoffs, settlement_indexes, sizes)
+    assert list(result.exposure[0, 0]) == [-1, -2, -3, -4, -2, -2]
+    assert list(result.portfolio_pnl[0]) == [0, 0, 1, 0, 1 + 4, 1]
+    assert list(result.drawdown[0]) == [0] * 6
+
+    # Marking the open swaps shows the losses before they are realised
+    mark_indexes = np.arange(6)[:, np.newaxis] + [1, 2]
+    mtms = np.where(mark_indexes < settlement_indexes[:, np.newaxis], 0.5, np.nan)
+    result = simulate(
+        rules,
+        percentiles,
+        carries,
+        payoffs,
+        settlement_indexes,
+        sizes,
+        marks=(mark_indexes, mtms),
+    )
+    assert list(result.open_mtm[0, 0]) == [0, -0.5, -0.5, -1.5, -0.5, -0.5]
+    assert list(result.drawdown[0]) == [0, 0.5, 0, 1, 0, 0]
+    assert list(result.summary().pnl) == [7, 0]
+
+    summary = simulate_summary(
+        RuleSet.grid(sell_percentile=[0.5, 0.8, 2], sell_carry=[0, 2]),
+        percentiles,
+        carries,
+        payoffs,
+        settlement_indexes,
+        sizes=np.arange(6 * 6).reshape(6, 6),
+        marks=(mark_indexes, mtms),
+        chunk_size=4,
+    )
+    expected = simulate(
+        RuleSet.grid(sell_percentile=[0.5, 0.8, 2], sell_carry=[0, 2]),
+        percentiles,
+        carries,
+        payoffs,
+        settlement_indexes,
+        sizes=np.arange(6 * 6).reshape(6, 6),
+        marks=(mark_indexes, mtms),
+    ).summary()
+    assert summary.equals(expected)
+
+    with pytest.raises(ValueError):
+        simulate(rules, percentiles, carries, payoffs, np.arange(6))
@@ -0,0 +1,47 @@
+from datetime import date
+import unittest
+import numpy as np
+
+from algorithm.term_structure import VolTermStructure, tenor_to_years
+
+
+def test_tenor_to_years():
+    assert tenor_to_years("1y") == 1
+    assert tenor_to_years("3M") == 0.25
+    assert round(tenor_to_years("1w"), 4) == round(7 / 365, 4)
+    with unittest.TestCase.assertRaises(None, ValueError):
+        tenor_to_years("1x")
+
+
+def test_vol_term_structure_interpolate():
+    dates = [date(2020, 1, 1), date(2020, 1, 2)]
+    tenors = [1, 0.25]  # Unsorted tenors are sorted on construction
+    vols = np.array([[0.2, 0.1], [0.3, 0.3]])
+    term_structure = VolTermStructure(dates, tenors, vols)
+    assert all(term_structure.tenors == [0.25, 1])
+
+    # Linear in total variance between tenors
+    results = term_structure.interpolate(0.5)
+    expected_var_1 = (0.1 ** 2 * 0.25 + (0.2 ** 2 - 0.1 ** 2 * 0.25) / 3) / 0.5
+    assert np.allclose(results, [expected_var_1 ** 0.5, 0.3])
+
+    # Flat extrapolation, and NaN for expired maturities
+    results = term_structure.interpolate(np.array([[0.1, 2, 0], [0.25, 1, -1]]))
+    assert np.allclose(results[:, :2], [[0.1, 0.2], [0.3, 0.3]])
+    assert np.isnan(results[:, 2]).all()
+
+    with unittest.TestCase.assertRaises(None, ValueError):
+        VolTermStructure(dates, tenors, np.ones([3, 2]))
+
+
+def test_live_rows():
+    dates = [date(2020, 1, d) for d in range(1, 8)]
+    term_structure = VolTermStructure(dates, [1], np.full(7, 0.1))
+    rows, live = term_structure.live_rows(
+        [date(2020, 1, 1), date(2020, 1, 3), date(2020, 1, 6)],
+        [date(2020, 1, 5), date(2020, 1, 4), date(2020, 2, 1)],
+    )
+    assert rows.shape == live.shape == (3, 3)
+    assert live.tolist() == [[1, 1, 1], [0, 0, 0], [1, 0, 0]]
+    assert rows[live].tolist() == [1, 2, 3, 6]
+    assert ((rows >= 0) & (rows < 7)).all()
@@ -1,7 +1,9 @@
 from datetime import date
 import math
+import numpy as np
 
 from algorithm.trade_classes import Trade, VarianceSwap
+from algorithm.term_structure import VolTermStructure
 
 
 def test_trade_parent_class():
@@ -60,3 +62,36 @@ def test_variance_swap():
         **params, skew_slope=skew_slope, linear_skew=False
     )
     assert round(log_linear_skew_fair_strike * 100, 1) == 22.8
+
+
+def test_variance_swap_batched_fair_strikes():
+    dates = [date(2020, 1, 1), date(2020, 2, 1), date(2020, 3, 1)]
+    term_structure = VolTermStructure(dates, [1 / 12, 1], [[0.1, 0.2]] * 3)
+    rows, fair_strikes = VarianceSwap.estimate_remaining_fair_strikes(
+        term_structure,
+        [date(2019, 12, 1), date(2019, 12, 31), date(2020, 1, 15)],
+        [date(2020, 2, 1), date(2021, 1, 1), date(2020, 2, 15)],
+        skew_slope=np.array([0.1, 0, 0]),
+    )
+    assert rows.shape == fair_strikes.shape == (3, 3)
+    # Only the dates after the trade date and before the value date
+    assert np.isnan(fair_strikes[0, 1:]).all() and fair_strikes[0, 0] > 0.1
+    assert not np.isnan(fair_strikes[1]).any()
+    assert fair_strikes[1, 0] > 0.2 and fair_strikes[1, 1] < 0.2
+    assert rows[2, 0] == 1 and np.isnan(fair_strikes[2, 1:]).all()
+
+    trade = VarianceSwap(
+        direction="buy",
+        underlying="EURUSD",
+        trade_date=date(2020, 1, 1),
+        value_date=date(2021, 1, 1),
+        strike=20,
+        var_amount=5_000,
+    )
+    mtms = trade.calc_mtm(
+        realised_vol=np.array([15, 15]),
+        fair_strike=np.array([19, 19]),
+        r=0.02,
+        valuation_date=[date(2020, 4, 1), date(2020, 4, 1)],
+    )
+    assert all(np.round(mtms) == -357_247)
@@ -0,0 +1,104 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+
+from algorithm.trade_classes import VarianceSwap
+from algorithm.trade_log import TradeLogWriter, TradeLogReader, EVENT_DTYPE
+
+
+def make_trades():
+    return [
+        VarianceSwap(
+            direction="buy" if i % 2 else "sell",
+            underlying="EURUSD" if i < 3 else "USDJPY",
+            trade_date=datetime.date(2020, 1, 1) + datetime.timedelta(days=i),
+            value_date=datetime.date(2020, 2, 1) + datetime.timedelta(days=i),
+            strike=0.05 + i / 100,
+            vega_amount=1,
+        )
+        for i in range(5)
+    ]
+
+
+def test_deterministic_trade_ids():
+    trades, same_trades = make_trades(), make_trades()
+    assert [t.trade_id for t in trades] == [t.trade_id for t in same_trades]
+    assert len({t.trade_id for t in trades}) == len(trades)
+    trade = trades[0]
+    explicit = VarianceSwap(
+        "sell",
+        "EURUSD",
+        trade.trade_date,
+        trade.value_date,
+        trade.strike,
+        vega_amount=1,
+        trade_id=trades[1].trade_id,
+    )
+    assert explicit.trade_id == trades[1].trade_id
+
+
+def test_trade_log(tmp_path):
+    filename = str(tmp_path / "trades.log")
+    trades = make_trades()
+    with TradeLogWriter(filename, buffer_size=3) as writer:
+        for trade in trades:
+            writer.log_open(trade)
+    # Existing logs are appended to
+    with TradeLogWriter(filename) as writer:
+        for trade in trades:
+            writer.log_mark(trade, datetime.date(2020, 1, 15), mtm=0.1)
+            writer.log_settlement(trade, payoff=-0.2, realised_vol=0.04)
+
+    with TradeLogReader(filename) as reader:
+        assert len(reader) == 15
+        assert reader.records.dtype == EVENT_DTYPE
+        opens = reader.select(events=["open"])
+        assert list(opens["strike"]) == [trade.strike for trade in trades]
+        assert list(opens["direction"]) == [-1, 1, -1, 1, -1]
+
+        records = reader.select(
+            start=datetime.date(2020, 1, 2),
+            end=datetime.date(2020, 2, 2),
+            pairs=["EURUSD"],
+        )
+        # 2 opens, 3 marks and the first 2 settlements
+        assert len(records) == 7
+        df = reader.read_dataframe(pairs=["USDJPY"], events=["settle"])
+        assert list(df.trade_id) == [trade.trade_id for trade in trades[3:]]
+        assert list(df.pair) == ["USDJPY"] * 2
+        assert list(df.value) == [-0.2, -0.2]
+        assert df.date.iloc[0] == pd.Timestamp("2020-02-04")
+    # The file is unmapped once the reader is closed
+    assert len(reader) == 0
+
+    with TradeLogWriter(filename, overwrite=True):
+        pass
+    with TradeLogReader(filename) as reader:
+        assert len(reader) == 0
+    with open(filename, "wb") as f:
+        f.write(b"not a trade log")
+    with pytest.raises(ValueError):
+        TradeLogReader(filename)
+
+
+def test_log_marks(tmp_path):
+    filename = str(tmp_path / "trades.log")
+    trades = make_trades()[:2]
+    mark_dates = np.array([["2020-01-02", "2020-01-03"], ["2020-01-03", "2020-01-04"]])
+    mtms = np.array([[0.1, 0.2], [0.3, np.nan]])
+    with TradeLogWriter(filename) as writer:
+        writer.log_marks(trades, mark_dates, mtms, realised_vols=mtms / 10)
+        writer.log_mark(trades[0], datetime.date(2020, 1, 2), 0.1, 0.01)
+
+    with TradeLogReader(filename) as reader:
+        df = reader.read_dataframe(events=["mark"])
+    ids = [trade.trade_id for trade in trades]
+    assert list(df.trade_id) == [ids[0], ids[0], ids[1], ids[0]]
+    assert list(df.value) == [0.1, 0.2, 0.3, 0.1]
+    assert list(df.realised_vol) == [0.01, 0.02, 0.03, 0.01]
+    assert list(df.direction) == [-1, -1, 1, -1]
+    # The batched and the single marks are the same records
+    assert (
+        df.drop(columns="trade_id").iloc[0].equals(df.drop(columns="trade_id").iloc[3])
+    )
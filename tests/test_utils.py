@@ -1,4 +1,12 @@
-from algorithm.utils import load_csv_data, timed
+import os
+
+from algorithm.utils import (
+    FileDef,
+    load_csv_data,
+    timed,
+    smile_file_defs,
+    smile_colnames,
+)
 from . import FILE_DEFS
 
 performance_iterations = 10
@@ -17,6 +25,23 @@ def test_load_csv_data():
     assert data.count()["1y_atmf_vol"] == 3392
 
 
+def test_load_csv_data_field(tmp_path):
+    filename = os.path.join(tmp_path, "EURUSDxSPOT.csv")
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("\ufeffDate,PX_LAST,PX_HIGH\n")
+        f.write("15/10/2020,1.17,1.18\n14/10/2020,1.16,1.19\n13/10/2020,1.15,1.2\n")
+    file_defs = [
+        FileDef(filename=filename, colname="spot"),
+        FileDef(filename=filename, colname="high", field="PX_HIGH"),
+    ]
+    for load_using_pandas in (False, True):
+        data = load_csv_data(*file_defs, load_using_pandas=load_using_pandas)
+        data = data.sort_values("date")
+        assert list(data.date.dt.day) == [13, 14, 15]
+        assert list(data.spot) == [1.15, 1.16, 1.17]
+        assert list(data.high) == [1.2, 1.19, 1.18]
+
+
 def performance_test_load_csv_data_performance():
     global FILE_DEFS, performance_iterations
 
@@ -41,3 +66,11 @@ def performance_test_load_csv_data_performance():
     avg_perf_without_pd = sum(without_pandas_times) / len(without_pandas_times)
     print("Avg. perf using Pandas" + str(avg_perf_using_pd) + "s")
     print("Avg. perf without Pandas" + str(avg_perf_without_pd) + "s")
+
+
+def test_smile_file_defs():
+    file_defs = smile_file_defs("EURUSD", "1m", "market_data")
+    assert [f.colname for f in file_defs] == [
+        smile_colnames("1m")[key] for key in ("rr_25", "bf_25", "rr_10", "bf_10")
+    ]
+    assert file_defs[0].filename == os.path.join("market_data", "EURUSDx25R1M.csv")
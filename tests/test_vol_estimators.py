@@ -0,0 +1,133 @@
+import math
+import numpy as np
+import pytest
+
+from algorithm.utils import timed
+from algorithm.trade_classes import VarianceSwap
+from algorithm.vol_estimators import (
+    CloseToClose,
+    Parkinson,
+    GarmanKlass,
+    HAR,
+    GARCH11,
+)
+
+performance_iterations = 10
+
+
+def simulate_levels(n_days, n_series, daily_vol=0.01, seed=0):
+    random_state = np.random.RandomState(seed)
+    returns = daily_vol * random_state.standard_normal((n_days, n_series))
+    return 100 * np.exp(np.cumsum(returns, axis=0))
+
+
+def test_close_to_close():
+    levels = np.array([1, 1.1, 1.05, 1.2, 1.15])
+    returns = np.log(levels[1:] / levels[:-1])
+    vols = CloseToClose(window_size=4, periods_per_year=12).estimate(levels)
+    assert vols.shape == (5, 1)
+    assert np.isnan(vols[:4]).all()
+    assert vols[4, 0] == pytest.approx(math.sqrt(12 * np.mean(returns ** 2)))
+    vols = CloseToClose(window_size=4, zero_mean=False, periods_per_year=12).estimate(
+        levels
+    )
+    assert vols[4, 0] == pytest.approx(math.sqrt(12) * np.std(returns, ddof=1))
+
+    # Every series of a panel is estimated independently
+    panel = simulate_levels(100, 3)
+    vols = CloseToClose(window_size=21).estimate(panel)
+    for i in range(3):
+        assert np.allclose(
+            vols[:, i],
+            CloseToClose(window_size=21).estimate(panel[:, i])[:, 0],
+            equal_nan=True,
+        )
+
+
+def test_range_estimators():
+    close = simulate_levels(50, 2)
+    open = close * 1.001
+    high, low = close * 1.01, close * 0.99
+    with pytest.raises(ValueError):
+        Parkinson(window_size=5).estimate(close)
+
+    vols = Parkinson(window_size=5).estimate(close, high=high, low=low)
+    expected = math.sqrt(252 * math.log(1.01 / 0.99) ** 2 / (4 * math.log(2)))
+    assert np.allclose(vols[4:], expected)
+
+    vols = GarmanKlass(window_size=5).estimate(close, open, high, low)
+    expected = math.sqrt(
+        252
+        * (
+            0.5 * math.log(1.01 / 0.99) ** 2
+            - (2 * math.log(2) - 1) * math.log(1 / 1.001) ** 2
+        )
+    )
+    assert np.allclose(vols[4:], expected)
+
+
+def test_forecasters():
+    daily_vol = 0.01
+    panel = simulate_levels(1000, 2, daily_vol=daily_vol)
+    panel[500, 1] = np.NaN
+    annual_vol = daily_vol * math.sqrt(252)
+    for forecaster in (HAR(window_size=21), GARCH11(window_size=21, fit_size=750)):
+        forecasts = forecaster.estimate(panel)
+        assert forecasts.shape == panel.shape
+        # Constant vol: the forecasts stay close to the true vol
+        assert np.nanmean(forecasts) == pytest.approx(annual_vol, rel=0.05)
+        assert np.nanmax(np.abs(forecasts[100:-1] - annual_vol)) < annual_vol / 2
+
+        # Fitted on the first fit_size days only: later data cannot
+        # change the forecasts made before
+        forecaster.fit_size = 750
+        shocked = panel.copy()
+        shocked[750:] *= np.exp(np.cumsum(np.full([250, 2], 0.05), axis=0))
+        assert np.allclose(
+            forecaster.estimate(panel)[:750],
+            forecaster.estimate(shocked)[:750],
+            equal_nan=True,
+        )
+
+
+def test_calc_final_realised_vol_estimator():
+    levels = np.array([1, 1.1, np.nan, 1.05, 1.2, 1.15])
+    returns = np.log(np.array([1.1, 1.05, 1.2, 1.15]) / np.array([1, 1.1, 1.05, 1.2]))
+    assert VarianceSwap.calc_final_realised_vol(
+        levels, estimator=CloseToClose
+    ) == pytest.approx(math.sqrt(252 * np.mean(returns ** 2)))
+
+    # Range estimators skip the days with any missing field
+    high, low = levels * 1.01, levels * 0.99
+    high[0] = levels[1] * 1.02
+    low[4] = np.nan
+    expected = math.sqrt(
+        252
+        * (3 * math.log(1.01 / 0.99) ** 2 + math.log(1.02 * 1.1 / 0.99) ** 2)
+        / 4
+        / (4 * math.log(2))
+    )
+    assert VarianceSwap.calc_final_realised_vol(
+        levels, estimator=Parkinson, high=high, low=low
+    ) == pytest.approx(expected)
+    with pytest.raises(ValueError):
+        VarianceSwap.calc_final_realised_vol(levels, estimator=HAR)
+
+
+def performance_test_vol_estimators():
+    global performance_iterations
+    panel = simulate_levels(5000, 20)
+    estimators = [
+        CloseToClose(window_size=21),
+        Parkinson(window_size=21),
+        HAR(window_size=21),
+        GARCH11(window_size=21),
+    ]
+    for estimator in estimators:
+
+        @timed
+        def estimate():
+            return estimator.estimate(panel, high=panel * 1.01, low=panel * 0.99)
+
+        times = [estimate() for _ in range(performance_iterations)]
+        print(f"Avg. perf {estimator}: {sum(times) / len(times)}s")
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from algorithm.walk_forward import (
+    CumulativeHitRates,
+    decide_directions,
+    walk_forward,
+)
+
+
+def test_cumulative_hit_rates():
+    cells = np.array([0, 1, 0, 1, 0])
+    payoffs = np.array([1, -1, -1, np.nan, 2])
+    cumulative = CumulativeHitRates(cells, payoffs, 2)
+    window = cumulative.window(1, 5)
+    assert list(window.counts) == [2, 1]
+    assert list(window.positive_counts) == [1, 0]
+    merged = cumulative.window(0, 1) + window
+    assert list(merged.hit_rates) == [2 / 3, 0]
+
+
+def test_decide_directions():
+    directions = decide_directions(
+        np.array([0.8, 0.1, 0.5, 0.9, np.nan]),
+        np.array([10, 10, 10, 1, 0]),
+        buy_threshold=0.6,
+        sell_threshold=0.4,
+        min_count=2,
+    )
+    assert list(directions) == [1, -1, 0, 0, 0]
+
+
+def test_walk_forward():
+    n = 100
+    dates = pd.date_range("2020-01-01", periods=n).values
+    xs = np.tile([0.1, 0.9], n // 2)
+    ys = np.zeros(n)
+    # Buying is profitable in the low x cell only
+    payoffs = np.where(xs < 0.5, 1.0, -1.0)
+    shape = (
+        {"divisions": 2, "max": 1, "min": 0},
+        {"divisions": 1, "max": 1, "min": -1},
+    )
+    kwargs = {"train_size": 20, "test_size": 10, "embargo": 2}
+    results = walk_forward(dates, xs, ys, payoffs, shape, **kwargs)
+    assert len(results) == 8
+    assert results.test_start.iloc[0] == dates[22]
+    assert results.train_end.iloc[0] == dates[19]
+    assert (results.hit_rate == 1).all()
+    assert list(results.pnl) == [10] * 7 + [8]  # Last test window is partial
+    assert (results.n_buys == results.n_sells).all()
+
+    parallel_results = walk_forward(
+        dates, xs, ys, payoffs, shape, n_jobs=2, expanding=True, **kwargs
+    )
+    pd.testing.assert_frame_equal(
+        results.drop(columns="train_start"),
+        parallel_results.drop(columns="train_start"),
+    )
+    assert (parallel_results.train_start == dates[0]).all()
+
+    # Trades settling 3 days after the trade date: the training windows end
+    # 3 trades before the test windows start, as with an embargo of 3.
+    value_dates = dates + np.timedelta64(3, "D")
+    results = walk_forward(
+        dates,
+        xs,
+        ys,
+        payoffs,
+        shape,
+        train_size=20,
+        test_size=10,
+        value_dates=value_dates,
+    )
+    assert len(results) == 7  # The first fold has fewer than 20 settled trades
+    assert results.test_start.iloc[0] == dates[30]
+    assert results.train_end.iloc[0] == dates[26]
+    assert results.train_start.iloc[0] == dates[7]